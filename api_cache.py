@@ -0,0 +1,71 @@
+import time
+import pickle
+import sqlite3
+import threading
+import profiling
+
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class ApiCache:
+    # Persistent cache of API responses in SQLite, keyed by (kind, key). Entries older than `ttl` seconds are
+    # ignored (and purged on open); once there are more than `max_entries`, the least recently used ones are
+    # evicted. With refresh=True, lookups always miss but fresh responses are still stored.
+    def __init__(self, path, *, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, refresh=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            self.conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+
+    def get(self, kind, key):
+        # returns (True, value) on a hit and (False, None) on a miss
+        if not self.refresh:
+            with self.lock:
+                row = self.conn.execute('SELECT value FROM responses WHERE kind = ? AND key = ? AND created >= ?',
+                                        (kind, key, time.time() - self.ttl)).fetchone()
+                if row is not None:
+                    with self.conn:
+                        self.conn.execute('UPDATE responses SET accessed = ? WHERE kind = ? AND key = ?', (time.time(), kind, key))
+                    self.hits += 1
+                    profiling.count(f'api_cache.hits.{kind}')
+                    return True, pickle.loads(row[0])
+        with self.lock:
+            self.misses += 1
+        profiling.count(f'api_cache.misses.{kind}')
+        return False, None
+
+    def put(self, kind, key, value):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO responses (kind, key, value, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                              (kind, key, pickle.dumps(value), now, now))
+            excess = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute('DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY accessed LIMIT ?)', (excess,))
+
+    def call(self, kind, key, fn, *args):
+        found, value = self.get(kind, key)
+        if not found:
+            value = fn(*args)
+            self.put(kind, key, value)
+        return value
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,465 @@
+import os
+import sys
+import csv
+import json
+import html
+import time
+import zlib
+import gzip
+import random
+import shutil
+import logging
+import argparse
+import datetime
+import platform
+import threading
+import contextlib
+import statistics
+import subprocess
+import tempfile
+import unicodedata
+import http.server
+import html.entities
+import multiprocessing
+import concurrent.futures
+from urllib.parse import urlparse, parse_qs
+from dblp_data import iter_dblp_records, get_dblp_file, LOCAL_DIR, LOCAL_FILE, INDEX_DIR
+import profiling
+
+
+def time_extraction(path, engine, workers=None):
+    start = time.perf_counter()
+    records = list(iter_dblp_records(path, engine=engine, workers=workers))
+    return time.perf_counter() - start, records
+
+
+def bench_extract(args):
+    path = args.dump or get_dblp_file()
+    workers = args.workers or os.cpu_count() or 1
+    print(f'benchmarking extraction from {path} ({os.path.getsize(path) / 1e6:.1f} MB compressed)')
+    etree_time, etree_records = time_extraction(path, 'etree')
+    lxml_time, lxml_records = time_extraction(path, 'lxml', workers)
+    assert [r[:-1] for r in etree_records] == [r[:-1] for r in lxml_records], 'engines produced different records'
+    print(f'  etree (current):        {etree_time:8.2f}s  {len(etree_records)} records')
+    print(f'  lxml ({workers} workers): {lxml_time:8.2f}s  {len(lxml_records)} records')
+    print(f'  speedup: {etree_time / lxml_time:.2f}x')
+    # there is no previous index here, as on a first build, which shouldn't spend time on the record hashes that only
+    # incremental rebuilds use (computing them anyway once made lxml on one worker slower than etree)
+    assert not any(r[-1] for r in lxml_records), 'lxml engine hashed records without a previous index'
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_COMMANDS = {
+    'import dblp_data': ['-c', 'import dblp_data'],
+    'import find_conflicts': ['-c', 'import find_conflicts'],
+    'import match_dblp': ['-c', 'import match_dblp'],
+    'find_conflicts.py --help': [f'{REPO_DIR}/find_conflicts.py', '--help'],
+    'match_dblp.py --help': [f'{REPO_DIR}/match_dblp.py', '--help'],
+    # every row already has a dblp id, so nothing should be loaded
+    'match_dblp.py (nothing to match)': [f'{REPO_DIR}/match_dblp.py', 'matched.csv'],
+}
+
+
+def time_command(args, cwd):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=cwd, env={**os.environ, 'PYTHONPATH': REPO_DIR}, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def bench_startup(args):
+    # each command runs in a fresh interpreter, in an empty directory so nothing touches the local caches
+    slow = []
+    with tempfile.TemporaryDirectory() as cwd:
+        with open(f'{cwd}/matched.csv', 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['first name', 'last name', 'dblp_id', 'dblp_name', 'dblp_affiliations'])
+            writer.writerow(['Jane', 'Doe', '00/0000', 'Jane Doe', 'Nowhere'])
+        print(f'benchmarking startup (median of {args.repeat} runs)')
+        for label, command in STARTUP_COMMANDS.items():
+            elapsed = statistics.median(time_command(command, cwd) for _ in range(args.repeat))
+            print(f'  {label:34} {elapsed:6.2f}s')
+            if args.max_seconds is not None and elapsed > args.max_seconds:
+                slow.append(label)
+    if slow:
+        sys.exit(f'slower than {args.max_seconds}s: {", ".join(slow)}')
+
+
+# synthetic data: a dblp.xml.gz with the same schema as the real dump (homepages with affiliations, disambiguation
+# pages and their homonyms "Name 0001", publications over a range of years, names with accents as entities), and
+# EasyChair committee/author exports whose names exercise every matching path. the people behind it are kept so
+# that the stub API can answer for them
+FIRST_NAMES = ['Alice', 'Bruno', 'Chiara', 'Daniel', 'Elena', 'Felix', 'Greta', 'Hiroshi', 'Ingrid', 'Jakob', 'Karin',
+               'Luca', 'Marta', 'Nils', 'Olga', 'Pavel', 'Quentin', 'Rosa', 'Stefan', 'Tomás', 'Ursula', 'Victor',
+               'Wei', 'Ximena', 'Yusuf', 'Zoë', 'José', 'Søren', 'Ana', 'Björn', 'Chen', 'Dilnoza', 'Émile', 'Farah']
+NAME_SYLLABLES = ['ber', 'mül', 'son', 'ka', 'ro', 'van', 'li', 'ter', 'ho', 'gar', 'ci', 'ne', 'dal', 'mo', 'ren',
+                  'shi', 'ta', 'wa', 'kov', 'ić', 'ström', 'ez', 'lu', 'pa', 'dra', 'fe', 'no', 'ske', 'vi', 'an']
+VENUES = ['conf/sigir', 'conf/ecir', 'conf/cikm', 'conf/wsdm', 'conf/kdd', 'journals/tois', 'journals/ipm', 'journals/irj']
+AFFILIATIONS = [f'University of {city}' for city in ['Glasgow', 'Amsterdam', 'Pisa', 'Melbourne', 'Waterloo', 'Tokyo',
+                                                     'Leipzig', 'Padua', 'Porto', 'Tsinghua', 'Copenhagen', 'Delft']]
+
+
+def _synthetic_name(rng, used):
+    while True:
+        last = ''.join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        name = f'{rng.choice(FIRST_NAMES)} {last}'
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def _xml_text(text):
+    # dblp.xml writes non-ASCII characters as (DTD-declared) named entities
+    return ''.join(f'&{html.entities.codepoint2name[ord(c)]};' if ord(c) > 127 and ord(c) in html.entities.codepoint2name
+                   else html.escape(c, quote=False) for c in text)
+
+
+def _www(key, names, affiliations=(), disambiguation=False):
+    publtype = ' publtype="disambiguation"' if disambiguation else ''
+    body = ''.join(f'<author>{_xml_text(n)}</author>\n' for n in names)
+    body += ''.join(f'<note type="affiliation">{_xml_text(a)}</note>\n' for a in affiliations)
+    return f'<www mdate="2024-01-01" key="homepages/{key}"{publtype}>\n{body}<title>Home Page</title>\n</www>\n'
+
+
+def write_synthetic_dump(path, rng, *, authors, pubs, first_year, last_year, disambiguations, homepages):
+    # returns the people in it as {'persons': {pid: (name, affiliations)}, 'disambiguations': {pid: (name, [pids])},
+    # 'names': [(name, pid or None)] in decreasing order of productivity, 'pubs': [[names]]}
+    used = set()
+    names = [_synthetic_name(rng, used) for _ in range(authors)]
+    persons = {}
+    pages = {}
+    records = []
+    # homonyms share a name on their disambiguation page, and publish as "Name 0001", "Name 0002", ...
+    homonym_names = set(rng.sample(range(authors), min(disambiguations, authors)))
+    people = []
+    for i, name in enumerate(names):
+        if i in homonym_names:
+            pid = f'{i % 100:02d}/{i}'
+            homonyms = [(f'{pid}-{k}', f'{name} {k:04d}') for k in range(1, rng.randint(2, 4) + 1)]
+            pages[pid] = (name, [h for h, _ in homonyms])
+            records.append(_www(pid, [name], disambiguation=True))
+            for h_pid, h_name in homonyms:
+                persons[h_pid] = (h_name, [rng.choice(AFFILIATIONS)])
+                records.append(_www(h_pid, [h_name], persons[h_pid][1]))
+                people.append((h_name, h_pid))
+        elif rng.random() < homepages:
+            pid = f'{i % 100:02d}/{i}'
+            persons[pid] = (name, [rng.choice(AFFILIATIONS)] if rng.random() < 0.7 else [])
+            records.append(_www(pid, [name], persons[pid][1]))
+            people.append((name, pid))
+        else:
+            people.append((name, None))
+    # a few prolific authors and a long tail, like the real thing
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(people))]
+    cum_weights = [0.0] * len(weights)
+    total = 0.0
+    for i, w in enumerate(weights):
+        total += w
+        cum_weights[i] = total
+    pub_authors = []
+    for p in range(pubs):
+        venue = rng.choice(VENUES)
+        year = rng.randint(first_year, last_year)
+        authors_of = list(dict.fromkeys(name for name, _ in rng.choices(people, cum_weights=cum_weights, k=rng.randint(1, 6))))
+        pub_authors.append(authors_of)
+        tag, container = ('article', 'journal') if venue.startswith('journals/') else ('inproceedings', 'booktitle')
+        body = ''.join(f'<author>{_xml_text(a)}</author>\n' for a in authors_of)
+        records.append(f'<{tag} mdate="2024-01-01" key="{venue}/{p}">\n{body}<title>Synthetic Paper {p} &amp; More.</title>\n'
+                       f'<pages>{p % 90 + 1}-{p % 90 + 10}</pages>\n<year>{year}</year>\n'
+                       f'<{container}>{venue.split("/")[1].upper()}</{container}>\n<ee>https://doi.org/10.0000/{p}</ee>\n</{tag}>\n')
+    with gzip.open(path, 'wt', encoding='iso-8859-1', errors='xmlcharrefreplace') as f:
+        f.write('<?xml version="1.0" encoding="ISO-8859-1"?>\n<!DOCTYPE dblp SYSTEM "dblp.dtd">\n<dblp>\n')
+        f.writelines(records)
+        f.write('</dblp>\n')
+    return {'persons': persons, 'disambiguations': pages, 'names': people, 'pubs': pub_authors}
+
+
+def _strip_accents(name):
+    return ''.join(c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c))
+
+
+def _easychair_name(rng, name, pid, persons):
+    # how a person shows up in EasyChair: mostly as in dblp, sometimes without accents, in lower case, with an
+    # initial, misspelled, or with the name shared by homonyms. returns (first name, last name, affiliation)
+    affiliation = (persons[pid][1] or [''])[0] if pid in persons else rng.choice(AFFILIATIONS)
+    base = name.rsplit(' ', 1)[0] if name[-4:].isdigit() else name
+    first, last = base.split(' ', 1)
+    variant = rng.random()
+    if variant < 0.05:
+        first, last = _strip_accents(first).lower(), _strip_accents(last).lower()
+    elif variant < 0.10:
+        first = first[0] + '.'
+    elif variant < 0.15 and len(last) > 4:
+        i = rng.randrange(1, len(last) - 1)
+        last = last[:i] + last[i + 1] + last[i] + last[i + 2:]
+    return first, last, affiliation
+
+
+def write_synthetic_csvs(workdir, universe, rng, *, committee, submissions, unknown=0.05):
+    persons = universe['persons']
+    people = universe['names']
+    used = {name for name, _ in people}
+    # the committee comes from the more prolific authors
+    members = rng.sample(people[:max(committee * 3, 1)], min(committee, len(people)))
+    with open(f'{workdir}/committee.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['#', 'person #', 'first name', 'last name', 'email', 'affiliation', 'country'])
+        for i, (name, pid) in enumerate(members):
+            first, last, affiliation = _easychair_name(rng, name, pid, persons)
+            writer.writerow([i + 1, 100 + i, first, last, '', affiliation, ''])
+    # the authors of a submission are (mostly) co-authors of a paper in the dump, plus some people who aren't in it
+    with open(f'{workdir}/author.csv', 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['submission #', 'first name', 'last name', 'email', 'country', 'affiliation', 'Web page', 'person #', 'corresponding?'])
+        person_nums = {}
+        pids = dict(people)
+        for s in range(1, submissions + 1):
+            authors = rng.choice(universe['pubs'])[:4]
+            rows = [_easychair_name(rng, name, pids.get(name), persons) for name in authors]
+            if rng.random() < unknown * len(rows):
+                rows.append((*_synthetic_name(rng, used).split(' ', 1), rng.choice(AFFILIATIONS)))
+            for first, last, affiliation in rows:
+                person_num = person_nums.setdefault((first, last), 1000 + len(person_nums))
+                writer.writerow([s, first, last, '', '', affiliation, '', person_num, ''])
+
+
+class StubDblpApi:
+    # the parts of the DBLP API that pyterrier-services' DblpApi uses (author search, /pid/ pages, in UTF-8), answered
+    # from the synthetic people with a fixed latency. `calls` counts requests
+    def __init__(self, universe, latency=0.0):
+        self.persons = universe['persons']
+        self.disambiguations = universe['disambiguations']
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.by_name = {}
+        for pid, (name, _) in self.persons.items():
+            key = name.rsplit(' ', 1)[0] if name[-4:].isdigit() else name
+            self.by_name.setdefault(self._key(key), []).append(pid)
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, content_type, body = stub.answer(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def _key(name):
+        return ' '.join(_strip_accents(name).lower().replace('.', ' ').split())
+
+    def answer(self, path):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        if url.path == '/search/author/api':
+            name = query['q'][0]
+            pids = self.by_name.get(self._key(name), []) if int(query.get('f', ['0'])[0]) == 0 else []
+            if not pids and int(query.get('f', ['0'])[0]) == 0 and zlib.crc32(name.encode()) % 2:
+                # a namesake that isn't in the dump
+                pids = [f'x/{zlib.crc32(name.encode())}']
+            hits = [{'info': {'author': self.persons.get(pid, (name, []))[0], 'url': f'https://dblp.org/pid/{pid}',
+                              'notes': {'note': [{'@type': 'affiliation', 'text': a} for a in self.persons.get(pid, (name, ['Elsewhere']))[1]]}}}
+                    for pid in pids]
+            body = {'result': {'hits': {'@first': query.get('f', ['0'])[0], '@sent': str(len(hits)), '@total': str(len(hits)), 'hit': hits}}}
+            return 200, 'application/json', json.dumps(body).encode('utf-8')
+        if url.path.startswith('/pid/') and url.path.endswith('.xml'):
+            pid = url.path[len('/pid/'):-len('.xml')]
+            if pid in self.disambiguations:
+                homonyms = ''.join(f'<h><person><author pid="{h}">{html.escape(self.persons[h][0], quote=False)}</author>'
+                                   + ''.join(f'<note type="affiliation">{html.escape(a, quote=False)}</note>' for a in self.persons[h][1])
+                                   + '</person></h>' for h in self.disambiguations[pid][1])
+                return 200, 'application/xml', f'<dblpperson><homonyms>{homonyms}</homonyms></dblpperson>'.encode('utf-8')
+            name, affiliations = self.persons.get(pid, (f'Person {pid}', []))
+            notes = ''.join(f'<note type="affiliation">{html.escape(a, quote=False)}</note>' for a in affiliations)
+            return 200, 'application/xml', f'<dblpperson><person><author pid="{pid}">{html.escape(name, quote=False)}</author>{notes}</person></dblpperson>'.encode('utf-8')
+        return 404, 'text/plain', b''
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# the stages, each run in a fresh process in the working directory: a function that does any imports and setup
+# and returns the callable to time, which may return extra numbers for the results
+def _stage_build():
+    from dblp_data import cache_author_pub_mappings
+    from dblp_index import index_meta
+
+    def run():
+        cache_author_pub_mappings()
+        meta = index_meta(f'{LOCAL_DIR}/{INDEX_DIR}')
+        return {'authors': meta['authors'], 'pubs': meta['pubs']}
+    return run
+
+
+def _stage_loader(loader):
+    # calls the loader (building what it derives from the index on first use) and goes over everything in it
+    import dblp_data
+
+    def run():
+        loaded = getattr(dblp_data, loader)()
+        if hasattr(loaded, 'items'):
+            return {'entries': sum(1 for _ in loaded.items())}
+        return {}
+    return run
+
+
+def _stage_match(input_csv, output_csv, api_url, refresh):
+    import match_dblp
+    match_dblp.api_url = api_url
+    match_dblp.get_dblp_api()  # importing pyterrier-services is startup cost, not matching
+
+    def run():
+        match_dblp.update_csv_with_dblp(input_csv, output_csv, rps=0, refresh=refresh)
+        with open(output_csv, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        return {'rows': len(rows), 'matched': sum(1 for row in rows if row['dblp_id'])}
+    return run
+
+
+def _stage_conflicts(committee_csv, author_csv):
+    import find_conflicts
+
+    def run():
+        return {'conflicts': find_conflicts.main(committee_csv, author_csv, shared_counts=True, output_csv='conflicts.csv')}
+    return run
+
+
+SYNTHETIC_STAGES = [
+    ('cache_author_pub_mappings', _stage_build, {}),
+    *((loader, _stage_loader, {'loader': loader}) for loader in ['get_index', 'get_coauthor_graph', 'get_name_index', 'get_author2id',
+                                                                   'get_author2pubs', 'get_pub2authors', 'get_disambiguation2id',
+                                                                   'get_id2affiliations']),
+    ('update_csv_with_dblp committee.csv', _stage_match, {'input_csv': 'committee.csv', 'output_csv': 'committee_dblp.csv', 'refresh': True}),
+    ('update_csv_with_dblp author.csv', _stage_match, {'input_csv': 'author.csv', 'output_csv': 'author_dblp.csv', 'refresh': True}),
+    ('update_csv_with_dblp author.csv (cached)', _stage_match, {'input_csv': 'author.csv', 'output_csv': 'author_dblp.csv', 'refresh': False}),
+    ('find_conflicts.main', _stage_conflicts, {'committee_csv': 'committee_dblp.csv', 'author_csv': 'author_dblp.csv'}),
+]
+
+
+def _run_stage(workdir, setup, kwargs, quiet):
+    os.chdir(workdir)
+    if quiet:
+        logging.disable(logging.INFO)  # match_dblp logs every row
+    run = setup(**kwargs)
+    rss_before = profiling.peak_rss_mb()
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            stack.enter_context(contextlib.redirect_stderr(devnull))
+        start = time.perf_counter()
+        extra = run() or {}
+        seconds = time.perf_counter() - start
+    # peak memory of the process (which includes the interpreter and imports, i.e., rss_before) and of any
+    # worker processes it started, and what the stage counted (records, matches by strategy, API calls, ...)
+    return {'seconds': seconds, 'peak_rss_mb': profiling.peak_rss_mb(), 'rss_before_mb': rss_before,
+            'children_peak_rss_mb': profiling.peak_rss_mb(children=True), **extra,
+            'counters': profiling.report()['counters']}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_synthetic(args):
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='dblp-benchmark-')
+    # generated from scratch every time, so the index is always built from nothing
+    if os.path.exists(f'{workdir}/{LOCAL_DIR}'):
+        shutil.rmtree(f'{workdir}/{LOCAL_DIR}')
+    os.makedirs(f'{workdir}/{LOCAL_DIR}')
+    rng = random.Random(args.seed)
+    scale = {'authors': args.authors, 'pubs': args.pubs, 'years': [args.first_year, args.last_year], 'disambiguations': args.disambiguations,
+             'homepages': args.homepages, 'committee': args.committee, 'submissions': args.submissions, 'api_latency': args.api_latency,
+             'seed': args.seed}
+    print(f'generating synthetic data in {workdir}')
+    start = time.perf_counter()
+    universe = write_synthetic_dump(f'{workdir}/{LOCAL_DIR}/{LOCAL_FILE}', rng, authors=args.authors, pubs=args.pubs, first_year=args.first_year,
+                                    last_year=args.last_year, disambiguations=args.disambiguations, homepages=args.homepages)
+    write_synthetic_csvs(workdir, universe, rng, committee=args.committee, submissions=args.submissions)
+    print(f'  {time.perf_counter() - start:.2f}s, {os.path.getsize(f"{workdir}/{LOCAL_DIR}/{LOCAL_FILE}") / 1e6:.1f} MB compressed')
+
+    stub = StubDblpApi(universe, args.api_latency)
+    results = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(), 'python': platform.python_version(),
+               'cpus': os.cpu_count(), 'scale': scale, 'stages': {}}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['stages']
+    try:
+        print(f'{"stage":42} {"time":>9} {"peak RSS":>10}')
+        for label, setup, kwargs in SYNTHETIC_STAGES:
+            if setup is _stage_match:
+                kwargs = {**kwargs, 'api_url': stub.url}
+            calls = stub.calls
+            # a fresh process per stage, so that nothing is already loaded and its peak memory is its own
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                stage = pool.submit(_run_stage, workdir, setup, kwargs, not args.verbose).result()
+            if setup is _stage_match:
+                stage['api_calls'] = stub.calls - calls
+            results['stages'][label] = stage
+            # peak memory is None where the platform doesn't report it
+            memory = stage['peak_rss_mb']
+            line = f'{label:42} {stage["seconds"]:8.2f}s ' + (f'{memory:8.1f}MB' if memory is not None else f'{"n/a":>10}')
+            if baseline and label in baseline:
+                line += f'  ({stage["seconds"] / max(baseline[label]["seconds"], 1e-9):.2f}x time'
+                if memory is not None and baseline[label]['peak_rss_mb']:
+                    line += f', {memory / baseline[label]["peak_rss_mb"]:.2f}x memory'
+                line += ')'
+            print(line)
+    finally:
+        stub.close()
+        if not args.workdir:
+            shutil.rmtree(workdir)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the dblp tooling.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    extract_parser = subparsers.add_parser('extract', help='compare the dblp.xml.gz extraction engines')
+    extract_parser.add_argument('--dump', help='path to a dblp.xml.gz file (defaults to the cached dump)')
+    extract_parser.add_argument('--workers', type=int, help='worker processes for the lxml engine (default: all cores)')
+    extract_parser.set_defaults(func=bench_extract)
+    startup_parser = subparsers.add_parser('startup', help='time imports and startup of the command line tools')
+    startup_parser.add_argument('--repeat', type=int, default=5, help='runs per command (default: 5)')
+    startup_parser.add_argument('--max_seconds', type=float, help='fail if any command takes longer than this')
+    startup_parser.set_defaults(func=bench_startup)
+    synthetic_parser = subparsers.add_parser('synthetic', help='time and measure every stage on generated data, with a stub DBLP API')
+    synthetic_parser.add_argument('--authors', type=int, default=20000, help='people in the generated dump (default: 20000)')
+    synthetic_parser.add_argument('--pubs', type=int, default=100000, help='publications in the generated dump (default: 100000)')
+    synthetic_parser.add_argument('--first_year', type=int, default=2000, help='publication years start here (default: 2000)')
+    synthetic_parser.add_argument('--last_year', type=int, default=2025, help='and end here (default: 2025)')
+    synthetic_parser.add_argument('--disambiguations', type=int, default=200, help='names shared by homonyms, with a disambiguation page (default: 200)')
+    synthetic_parser.add_argument('--homepages', type=float, default=0.9, help='fraction of the other people with a homepage record (default: 0.9)')
+    synthetic_parser.add_argument('--committee', type=int, default=200, help='committee members (default: 200)')
+    synthetic_parser.add_argument('--submissions', type=int, default=500, help='submissions in the author file (default: 500)')
+    synthetic_parser.add_argument('--api_latency', type=float, default=0.02, help='seconds the stub DBLP API takes per request (default: 0.02)')
+    synthetic_parser.add_argument('--seed', type=int, default=0, help='random seed for the generated data (default: 0)')
+    synthetic_parser.add_argument('--workdir', help='keep the generated data and outputs in this directory (its dblp_data/ is replaced)')
+    synthetic_parser.add_argument('--output', help='write the results to this JSON file')
+    synthetic_parser.add_argument('--compare', help='results JSON of an earlier run to compare against')
+    synthetic_parser.add_argument('--verbose', action='store_true', help="show the stages' own output")
+    synthetic_parser.set_defaults(func=bench_synthetic)
+    args = parser.parse_args()
+    args.func(args)
@@ -1,47 +1,219 @@
 import json
+import datetime
+import time
 import hashlib
 import os
+import io
+import re
 import gzip
+import zlib
+import shutil
+import collections
+import functools
+import threading
+import multiprocessing
+import concurrent.futures
 import requests
 import html.entities
 import xml.etree.ElementTree as ET
+from lxml import etree as lxml_etree
 from tqdm import tqdm
+import profiling
+from dblp_index import (DblpIndex, CoauthorGraph, NameIndex, INDEX_VERSION, COAUTHOR_DIR, NAMES_DIR, HOMEPAGE_PREFIX, index_meta,
+                        index_version, update_index_meta, write_index, write_coauthor_graph, write_name_index,
+                        Author2Pubs, Pub2Authors, Author2Id, Disambiguation2Id, Id2Affiliations)
 
 DBLP_URL = "https://dblp.org/xml/dblp.xml.gz"
 MD5_URL = "https://dblp.org/xml/dblp.xml.gz.md5"
 LOCAL_FILE = "dblp.xml.gz"
 LOCAL_DIR = 'dblp_data'
 ETAG_FILE = LOCAL_FILE + ".etag"
-CHUNK_SIZE = 8192
-
-
-def get_remote_md5():
-    resp = requests.get(MD5_URL, timeout=30)
+MD5_FILE = LOCAL_FILE + ".md5"
+INDEX_DIR = 'index'
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CHECKPOINT_INTERVAL = 1.0
+MAX_DOWNLOAD_RESTARTS = 2
+EXTRACT_BLOCK_SIZE = 16 * 1024 * 1024
+DEFAULT_SINCE = 2020
+RECORD_TAGS = ("article", "inproceedings", "proceedings", "book",
+               "incollection", "phdthesis", "mastersthesis",
+               "www", "data")
+RECORD_START_RE = re.compile(rb'<(?:' + b'|'.join(t.encode() for t in RECORD_TAGS) + rb')[\s>]')
+
+
+def get_remote_md5(session=requests, md5_url=MD5_URL):
+    resp = session.get(md5_url, timeout=30)
     resp.raise_for_status()
     return resp.text.strip().split()[0]
 
 
-def download_file(url, dest_path, etag=None):
-    md5 = hashlib.md5()
-    headers = {}
-    if etag:
-        headers["If-None-Match"] = etag
-
-    r = requests.get(url, headers=headers, stream=True, timeout=60)
-    if r.status_code == 304:
-        # Remote file unchanged (ETag match)
-        return None, None
-    r.raise_for_status()
-
-    with open(dest_path, "wb") as f, tqdm(total=int(r.headers.get('Content-Length', 0)), unit='iB', unit_scale=True, desc='dblp.xml.gz') as pbar:
-        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
-            if chunk:
-                f.write(chunk)
+class _RangeNotSatisfied(Exception):
+    pass
+
+
+def _new_session(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _load_download_state(dest_path):
+    if not os.path.exists(dest_path) or not os.path.exists(dest_path + '.state'):
+        return None
+    with open(dest_path + '.state') as f:
+        return json.load(f)
+
+
+def _save_download_state(dest_path, state):
+    with open(dest_path + '.state.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(dest_path + '.state.tmp', dest_path + '.state')
+
+
+def _split_segments(length, segments):
+    # [start, end, position] triples; end is None when the length is unknown
+    if length is None or segments <= 1:
+        return [[0, length, 0]]
+    size = -(-length // segments)
+    return [[start, min(start + size, length), start] for start in range(0, length, size)]
+
+
+def _iter_adaptive_chunks(response):
+    # grow the read size while reads return quickly and shrink it again when they stall
+    size = MIN_CHUNK_SIZE
+    while True:
+        start = time.perf_counter()
+        chunk = response.raw.read(size)
+        if not chunk:
+            return
+        yield chunk
+        elapsed = time.perf_counter() - start
+        if elapsed < 0.1:
+            size = min(size * 2, MAX_CHUNK_SIZE)
+        elif elapsed > 1.0:
+            size = max(size // 2, MIN_CHUNK_SIZE)
+
+
+def _file_md5(path, md5=None, length=None):
+    md5 = md5 or hashlib.md5()
+    with open(path, 'rb') as f:
+        remaining = length
+        while block := f.read(MAX_CHUNK_SIZE if remaining is None else min(MAX_CHUNK_SIZE, remaining)):
+            md5.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return md5
+
+
+def _download_segment(session, url, dest_path, state, segment, pbar, lock, response=None, md5=None):
+    start, end, position = segment
+    if end is not None and position >= end:
+        return
+    if response is None:
+        headers = {"Range": f"bytes={position}-" + (str(end - 1) if end is not None else '')}
+        if state['validator']:
+            headers["If-Range"] = state['validator']
+        response = session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code != 206:
+            # the server ignored the range (or the remote file changed since the partial download)
+            response.close()
+            raise _RangeNotSatisfied()
+    last_checkpoint = time.monotonic()
+    with response, open(dest_path, 'r+b') as f:
+        f.seek(position)
+        for chunk in _iter_adaptive_chunks(response):
+            f.write(chunk)
+            if md5 is not None:
                 md5.update(chunk)
-                pbar.update(len(chunk))
+            segment[2] += len(chunk)
+            pbar.update(len(chunk))
+            if time.monotonic() - last_checkpoint > DOWNLOAD_CHECKPOINT_INTERVAL:
+                f.flush()
+                with lock:
+                    _save_download_state(dest_path, state)
+                last_checkpoint = time.monotonic()
+    if end is not None and segment[2] < end:
+        raise IOError(f'connection closed early ({segment[2] - start} of {end - start} bytes)')
+
+
+def download_file(url, dest_path, etag=None, session=None, segments=None):
+    # Resumable download: progress is checkpointed to `dest_path`.state, and a re-run continues from there
+    # using Range requests. With segments > 1 (default: DBLP_DOWNLOAD_SEGMENTS), byte ranges are fetched in
+    # parallel over a pooled session. Returns (etag, md5), or (None, None) if the ETag matched.
+    segments = segments or int(os.environ.get('DBLP_DOWNLOAD_SEGMENTS', 1))
+    session = session or _new_session(segments)
+    for _ in range(MAX_DOWNLOAD_RESTARTS + 1):
+        try:
+            return _download(url, dest_path, etag, session, segments)
+        except _RangeNotSatisfied:
+            # the server didn't honour a range (or the file changed since the partial download): start over as a
+            # single stream, which doesn't need ranges. servers whose validator changes between requests (e.g.,
+            # per-backend ETags) would otherwise never answer the ranged requests of a segmented download
+            os.remove(dest_path + '.state')
+            segments = 1
+    raise IOError(f'download of {url} restarted {MAX_DOWNLOAD_RESTARTS} times without finishing')
+
+
+def _download(url, dest_path, etag, session, segments):
+    state = _load_download_state(dest_path)
+    response = None
+    if state is None:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        # splitting the download into ranges only takes the length and validators, so a HEAD request will do; the
+        # body is fetched as a single stream if the server doesn't do ranges
+        response = session.request('HEAD' if segments > 1 else 'GET', url, headers=headers, stream=True, timeout=60)
+        if response.request.method == 'HEAD' and response.ok and response.headers.get('Accept-Ranges') != 'bytes':
+            response = session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 304:
+            # Remote file unchanged (ETag match); a partial download that was restarted (see download_file) is dropped
+            response.close()
+            for path in (dest_path, dest_path + '.state'):
+                if os.path.exists(path):
+                    os.remove(path)
+            return None, None
+        response.raise_for_status()
+        length = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+        if response.headers.get('Accept-Ranges') != 'bytes':
+            segments = 1
+        state = {
+            'etag': response.headers.get('ETag'),
+            'validator': response.headers.get('ETag') or response.headers.get('Last-Modified'),
+            'length': length,
+            'segments': _split_segments(length, segments),
+        }
+        open(dest_path, 'wb').close()
+        if len(state['segments']) > 1 or response.request.method == 'HEAD':
+            response.close()
+            response = None
+        _save_download_state(dest_path, state)
+
+    done = sum(position - start for start, _, position in state['segments'])
+    lock = threading.Lock()
+    try:
+        with tqdm(total=state['length'], initial=done, unit='iB', unit_scale=True, desc='dblp.xml.gz') as pbar:
+            if len(state['segments']) == 1:
+                # hash the already-downloaded prefix, then keep hashing as the rest streams in
+                segment = state['segments'][0]
+                md5 = _file_md5(dest_path, length=segment[2])
+                _download_segment(session, url, dest_path, state, segment, pbar, lock, response=response, md5=md5)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(len(state['segments'])) as pool:
+                    futures = [pool.submit(_download_segment, session, url, dest_path, state, segment, pbar, lock) for segment in state['segments']]
+                    for future in futures:
+                        future.result()
+                md5 = _file_md5(dest_path)
+    finally:
+        if os.path.exists(dest_path + '.state'):
+            with lock:
+                _save_download_state(dest_path, state)
 
-    new_etag = r.headers.get("ETag")
-    return new_etag, md5.hexdigest()
+    os.remove(dest_path + '.state')
+    return state['etag'], md5.hexdigest()
 
 
 def get_local_etag():
@@ -51,29 +223,49 @@ def get_local_etag():
     return None
 
 
+def _needs_download():
+    return os.environ.get('UPDATE_DBLP_DATA') == '1' or not os.path.exists(f'{LOCAL_DIR}/{LOCAL_FILE}')
+
+
+def get_local_md5():
+    # recorded when the dump is downloaded (computed once for dumps downloaded before it was)
+    if not os.path.exists(f'{LOCAL_DIR}/{LOCAL_FILE}'):
+        return None
+    if not os.path.exists(f'{LOCAL_DIR}/{MD5_FILE}'):
+        with open(f'{LOCAL_DIR}/{MD5_FILE}', "w") as f:
+            f.write(_file_md5(f'{LOCAL_DIR}/{LOCAL_FILE}').hexdigest())
+    with open(f'{LOCAL_DIR}/{MD5_FILE}', "r") as f:
+        return f.read().strip().lower()
+
+
+def _install_dump(tmp_file, etag, md5):
+    # replaces the dump and its etag/md5; other files in LOCAL_DIR (the index, ext_author_info/, the API
+    # cache) are left alone, and the index is rebuilt when its manifest no longer matches the dump
+    os.replace(tmp_file, f'{LOCAL_DIR}/{LOCAL_FILE}')
+    with open(f'{LOCAL_DIR}/{ETAG_FILE}', "w") as f:
+        f.write(etag or '')
+    with open(f'{LOCAL_DIR}/{MD5_FILE}', "w") as f:
+        f.write(md5.lower())
+
+
 def get_dblp_file():
-    if os.environ.get('UPDATE_DBLP_DATA') != '1' and os.path.exists(f'{LOCAL_DIR}/{LOCAL_FILE}'):
+    if not _needs_download():
         return f'{LOCAL_DIR}/{LOCAL_FILE}'
 
-    local_etag = get_local_etag()
-    tmp_file = LOCAL_FILE + ".tmp"
+    os.makedirs(LOCAL_DIR, exist_ok=True)
+    local_etag = get_local_etag() if os.path.exists(f'{LOCAL_DIR}/{LOCAL_FILE}') else None
+    tmp_file = f'{LOCAL_DIR}/{LOCAL_FILE}.tmp'
 
-    new_etag, new_md5 = download_file(DBLP_URL, tmp_file, etag=local_etag)
+    with profiling.stage('index.download'):
+        new_etag, new_md5 = download_file(DBLP_URL, tmp_file, etag=local_etag)
 
-    if new_etag is None:
+    if new_md5 is None:
         print("dblp.xml.gz already up-to-date.")
         return f'{LOCAL_DIR}/{LOCAL_FILE}'
     else:
         remote_md5 = get_remote_md5()
         if new_md5.strip().lower() == remote_md5.strip().lower():
-            if not os.path.exists(LOCAL_DIR):
-                os.makedirs(LOCAL_DIR, exist_ok=True)
-            else:
-                for f in os.listdir(LOCAL_DIR):
-                    os.remove(os.path.join(LOCAL_DIR, f))
-            os.replace(tmp_file, f'{LOCAL_DIR}/{LOCAL_FILE}')
-            with open(f'{LOCAL_DIR}/{ETAG_FILE}', "w") as f:
-                f.write(new_etag)
+            _install_dump(tmp_file, new_etag, new_md5.strip())
         else:
             os.remove(tmp_file)
             raise ValueError("MD5 checksum mismatch — download aborted!")
@@ -81,13 +273,32 @@ def get_dblp_file():
     return f'{LOCAL_DIR}/{LOCAL_FILE}'
 
 
-def cache_author_pub_mappings():
-    authors = {}
-    publications = {}
-    disambiguations = {}
-
+def _read_record(elem):
+    # works on both ElementTree and lxml elements; returns (pub_key, author_names, is_disambiguation, year,
+    # affiliations), with year 0 for records without one. affiliations come from the <note type="affiliation">
+    # entries of homepage records. a single pass over the children is much cheaper than separate
+    # find()/findall() path lookups
+    pub_key = elem.attrib.get("key")
+    if not pub_key:
+        return None
+    author_names = []
+    affiliations = []
+    year = 0
+    for child in elem:
+        tag = child.tag
+        if tag == "author":
+            if child.text:
+                author_names.append(child.text)
+        elif tag == "year":
+            year = int(child.text)
+        elif tag == "note" and child.text and child.attrib.get("type") == "affiliation":
+            affiliations.append(child.text.strip())
+    return pub_key, author_names, elem.attrib.get("publtype") == "disambiguation", year, affiliations
+
+
+def _iter_records_etree(path):
     # iterparse returns events and elements as they are read
-    with gzip.open(get_dblp_file(), 'rb') as f:
+    with gzip.open(path, 'rb') as f:
         parser = ET.XMLParser()
         parser.entity.update(html.entities.entitydefs)
         parser.entity['umml'] = parser.entity['uuml']
@@ -95,83 +306,406 @@ def cache_author_pub_mappings():
         _, root = next(context)  # get root element <dblp>
 
         for event, elem in tqdm(context, desc="extracting author/pub mappings from dblp.xml.gz", unit='elem'):
-            tag = elem.tag
-            if tag in {"article", "inproceedings", "proceedings", "book",
-                         "incollection", "phdthesis", "mastersthesis",
-                         "www", "data"} and ((el_year := elem.find("year")) is None or int(el_year.text) >= 2020):
-                pub_key = elem.attrib.get("key")
-                if pub_key:
-                    author_names = [a.text for a in elem.findall("author") if a.text]
-                    if elem.attrib.get("publtype") == "disambiguation":
-                        assert pub_key.startswith('homepages/')
-                        for name in author_names:
-                            disambiguations[name] = pub_key[len('homepages/'):]
-                    else:
-                        publications[pub_key] = author_names
-                        for author_name in author_names:
-                            if author_name not in authors:
-                                authors[author_name] = []
-                            authors[author_name].append(pub_key)
-
+            if elem.tag in RECORD_TAGS:
+                record = _read_record(elem)
+                if record is not None:
+                    yield record + (0,)
                 elem.clear()
                 root.clear()
 
-    print('writing author2pubs cache')
-    with gzip.open(f'{LOCAL_DIR}/author2pubs.2020.json.gz', 'wt') as f:
-        json.dump(authors, f)
 
-    print('writing pub2authors cache')
-    with gzip.open(f'{LOCAL_DIR}/pub2authors.2020.json.gz', 'wt') as f:
-        json.dump(publications, f)
+def _fragment_prefix(header):
+    # dblp.xml relies on dblp.dtd for its character entities; declare them inline instead so that
+    # each chunk can be parsed on its own
+    xml_decl = re.match(rb'\s*<\?xml[^>]*\?>', header)
+    entities = dict(html.entities.name2codepoint, umml=html.entities.name2codepoint['uuml'])
+    return (
+        (xml_decl.group(0) if xml_decl else b'') +
+        b'<!DOCTYPE dblp [' +
+        b''.join(f'<!ENTITY {name} "&#{code};">'.encode('ascii') for name, code in entities.items()) +
+        b']><dblp>'
+    )
+
+
+def _last_record_start(buffer):
+    pos = len(buffer)
+    while (pos := buffer.rfind(b'<', 0, pos)) >= 0:
+        if RECORD_START_RE.match(buffer, pos):
+            return pos
+    return -1
+
+
+def _iter_record_chunks(blocks):
+    # re-slices a stream of decompressed blocks into (prefix, chunk) pairs, where each chunk holds only
+    # complete top-level records
+    buffer = b''
+    prefix = None
+    for block in blocks:
+        buffer += block
+        if prefix is None:
+            root_start = buffer.find(b'<dblp>')
+            if root_start < 0:
+                continue
+            prefix = _fragment_prefix(buffer[:root_start])
+            buffer = buffer[root_start + len(b'<dblp>'):]
+        cut = _last_record_start(buffer)
+        if cut > 0:
+            yield prefix, buffer[:cut]
+            buffer = buffer[cut:]
+    if prefix is None:
+        raise ValueError('<dblp> root element not found in dump')
+    buffer = buffer.rsplit(b'</dblp>', 1)[0]
+    if buffer.strip():
+        yield prefix, buffer
+
+
+def _parse_records(prefix, chunk):
+    # one entry per record, None for those without a key
+    records = []
+    context = lxml_etree.iterparse(io.BytesIO(prefix + chunk + b'</dblp>'), events=('end',), tag=RECORD_TAGS, huge_tree=True)
+    for _, elem in context:
+        records.append(_read_record(elem))
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    return records
+
+
+def _record_hash(raw):
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little', signed=True)
+
+
+# previous indexes by path, opened once per worker process
+_previous_indexes = {}
+
+
+def _previous_record(index, pub, record_hash):
+    return (index.pubs[pub], [index.authors[a] for a in index.pub_authors[pub]], False, index.pub_year[pub],
+            index.affiliations(pub), record_hash)
+
+
+def _parse_record_chunk(prefix, chunk, previous=None):
+    # Records of a chunk, each with a hash of its raw xml as the last field, and how many of them were reused:
+    # with the path of a `previous` index, records whose hash it already has are copied from there instead of
+    # being parsed again, which is most of them between two weekly dumps. Without one, finding and hashing every
+    # record would only slow the build down, so the chunk is parsed directly and its records get no hash (0); the
+    # next rebuild then parses everything and hashes it, and the ones after that reuse records.
+    if previous is None:
+        return [record + (0,) for record in _parse_records(prefix, chunk) if record is not None], 0
+    starts = [m.start() for m in RECORD_START_RE.finditer(chunk)]
+    spans = list(zip(starts, starts[1:] + [len(chunk)]))
+    hashes = [_record_hash(chunk[start:end]) for start, end in spans]
+    index = None
+    if previous is not None:
+        if previous not in _previous_indexes:
+            _previous_indexes[previous] = DblpIndex(previous)
+        index = _previous_indexes[previous]
+    pubs = index.find_hashes(hashes) if index is not None else [-1] * len(hashes)
+
+    missing = [i for i, pub in enumerate(pubs) if pub < 0]
+    if len(missing) == len(spans):
+        parsed = _parse_records(prefix, chunk)
+    else:
+        parsed = _parse_records(prefix, b''.join(chunk[spans[i][0]:spans[i][1]] for i in missing))
+    if len(parsed) != len(missing):
+        # the parser saw different record boundaries (shouldn't happen); parse everything, without hashes
+        return [record + (0,) for record in _parse_records(prefix, chunk) if record is not None], 0
+
+    records = [None] * len(spans)
+    for i, record in zip(missing, parsed):
+        if record is not None:
+            records[i] = record + (hashes[i],)
+    for i, pub in enumerate(pubs):
+        if pub >= 0:
+            records[i] = _previous_record(index, pub, hashes[i])
+    return [record for record in records if record is not None], len(spans) - len(missing)
+
+
+def _iter_decompressed(path, pbar):
+    with open(path, 'rb') as raw, gzip.open(raw, 'rb') as f:
+        while block := f.read(EXTRACT_BLOCK_SIZE):
+            pbar.update(raw.tell() - pbar.n)
+            profiling.count('index.bytes_decompressed', len(block))
+            yield block
+
+
+def _parsed_chunk(records, reused):
+    profiling.count('index.chunks')
+    profiling.count('index.records_reused', reused)
+    return records
+
+
+def _parse_record_chunks(chunks, workers, previous=None):
+    if workers <= 1:
+        try:
+            for prefix, chunk in chunks:
+                with profiling.stage('index.parse'):
+                    records = _parsed_chunk(*_parse_record_chunk(prefix, chunk, previous))
+                yield from records
+        finally:
+            _previous_indexes.pop(previous, None)
+        return
+    # bounded number of chunks in flight so that the decompressed dump never sits in memory at once. the time
+    # spent waiting on the workers is what parsing costs beyond decompression
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for prefix, chunk in chunks:
+            pending.append(pool.apply_async(_parse_record_chunk, (prefix, chunk, previous)))
+            if len(pending) >= 2 * workers:
+                with profiling.stage('index.wait_for_parse_workers'):
+                    records = _parsed_chunk(*pending.popleft().get())
+                yield from records
+        while pending:
+            with profiling.stage('index.wait_for_parse_workers'):
+                records = _parsed_chunk(*pending.popleft().get())
+            yield from records
+
+
+def _iter_records_lxml(path, workers, previous=None):
+    with tqdm(total=os.path.getsize(path), unit='iB', unit_scale=True, desc="extracting author/pub mappings from dblp.xml.gz") as pbar:
+        yield from _parse_record_chunks(_iter_record_chunks(profiling.timed(_iter_decompressed(path, pbar), 'index.decompress')), workers, previous)
+
+
+def _default_workers():
+    return int(os.environ.get('DBLP_EXTRACT_WORKERS', os.cpu_count() or 1))
+
+
+def iter_dblp_records(path, engine=None, workers=None, previous=None):
+    # (pub_key, author_names, is_disambiguation, year, affiliations, content hash) for each record. records are only
+    # hashed by the lxml engine with a `previous` index to reuse them from (otherwise the hash is 0)
+    engine = engine or os.environ.get('DBLP_EXTRACT_ENGINE', 'lxml')
+    if workers is None:
+        workers = _default_workers()
+    if engine == 'lxml':
+        return _iter_records_lxml(path, workers, previous)
+    elif engine == 'etree':
+        return _iter_records_etree(path)
+    raise ValueError(f'unknown extraction engine: {engine}')
+
+
+def _build_index(records, path, source=None):
+    publications = {}
+    years = {}
+    affiliations = {}
+    hashes = {}
+    disambiguations = {}
 
-    print('writing disambiguation2id cache')
-    with gzip.open(f'{LOCAL_DIR}/disambiguation2id.2020.json.gz', 'wt') as f:
-        json.dump(disambiguations, f)
+    count = 0
+    with profiling.stage('index.extract'):
+        for count, (pub_key, author_names, disambiguation, year, pub_affiliations, record_hash) in enumerate(records, 1):
+            if disambiguation:
+                assert pub_key.startswith('homepages/')
+                for name in author_names:
+                    disambiguations[name] = pub_key[len('homepages/'):]
+            else:
+                publications[pub_key] = author_names
+                years[pub_key] = year
+                hashes[pub_key] = record_hash
+                if pub_affiliations and pub_key.startswith('homepages/'):
+                    affiliations[pub_key] = pub_affiliations
+
+    profiling.count('index.records', count)
+    print('writing dblp index')
+    with profiling.stage('index.write'):
+        write_index(path, publications, disambiguations, years, affiliations, hashes, source)
+
+
+def _iter_download_decompressed(response, out_file, md5, pbar):
+    # tees the compressed HTTP stream to disk and the MD5 while yielding decompressed blocks to the parser
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in _iter_adaptive_chunks(response):
+        out_file.write(chunk)
+        md5.update(chunk)
+        pbar.update(len(chunk))
+        data = decompressor.decompress(chunk)
+        while decompressor.eof and decompressor.unused_data:
+            # next gzip member
+            rest = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data += decompressor.decompress(rest)
+        if data:
+            profiling.count('index.bytes_decompressed', len(data))
+            yield data
+
+
+def refresh_dblp_data(session=requests, url=DBLP_URL, md5_url=MD5_URL, workers=None):
+    # Downloads the dump and builds the index from the same stream, so the index is ready as soon as the
+    # download finishes. Nothing in LOCAL_DIR changes until the MD5 is verified. `session` can be anything
+    # with a requests-compatible get(). Returns False if the remote dump is unchanged (ETag match).
+    os.makedirs(LOCAL_DIR, exist_ok=True)
+    headers = {}
+    local_etag = get_local_etag()
+    if local_etag and os.path.exists(f'{LOCAL_DIR}/{LOCAL_FILE}'):
+        headers["If-None-Match"] = local_etag
 
+    r = session.get(url, headers=headers, stream=True, timeout=60)
+    if r.status_code == 304:
+        print("dblp.xml.gz already up-to-date.")
+        return False
+    r.raise_for_status()
 
-def get_pub2authors():
-    if not os.path.exists(f'{LOCAL_DIR}/pub2authors.2020.json.gz'):
-        cache_author_pub_mappings()
-    with gzip.open(f'{LOCAL_DIR}/pub2authors.2020.json.gz', 'r') as f:
-        pub2authors = json.load(f)
-    return pub2authors
+    tmp_file = f'{LOCAL_DIR}/{LOCAL_FILE}.tmp'
+    tmp_index = f'{LOCAL_DIR}/{INDEX_DIR}.new'
+    md5 = hashlib.md5()
+    written = 0
+    try:
+        with open(tmp_file, 'wb') as f, tqdm(total=int(r.headers.get('Content-Length', 0)), unit='iB', unit_scale=True, desc='downloading and extracting dblp.xml.gz') as pbar:
+            try:
+                # downloading and decompressing, as they are interleaved
+                chunks = _iter_record_chunks(profiling.timed(_iter_download_decompressed(r, f, md5, pbar), 'index.download_and_decompress'))
+                _build_index(_parse_record_chunks(chunks, workers or _default_workers(), _previous_index()), tmp_index)
+            finally:
+                written = f.tell()
+        remote_md5 = get_remote_md5(session, md5_url)
+        if md5.hexdigest().lower() != remote_md5.strip().lower():
+            os.remove(tmp_file)
+            raise ValueError("MD5 checksum mismatch — download aborted!")
+    except BaseException:
+        if os.path.exists(tmp_index):
+            shutil.rmtree(tmp_index)
+        if os.path.exists(tmp_file):
+            # keep what was downloaded so that the next run resumes it with Range requests
+            length = int(r.headers['Content-Length']) if 'Content-Length' in r.headers else None
+            _save_download_state(tmp_file, {
+                'etag': r.headers.get('ETag'),
+                'validator': r.headers.get('ETag') or r.headers.get('Last-Modified'),
+                'length': length,
+                'segments': [[0, length, written]],
+            })
+        raise
+
+    update_index_meta(tmp_index, source={'md5': md5.hexdigest().lower(), 'etag': r.headers.get("ETag")})
+    _install_dump(tmp_file, r.headers.get("ETag"), md5.hexdigest())
+    _replace_index(tmp_index)
+    return True
+
+
+def _local_source():
+    # what the manifest of an index built from the local dump records about it
+    return {'md5': get_local_md5(), 'etag': get_local_etag()}
+
+
+def _index_is_current():
+    # the manifest matches both the index format and the local dump
+    meta = index_meta(f'{LOCAL_DIR}/{INDEX_DIR}')
+    return meta is not None and meta.get('version') == INDEX_VERSION and meta.get('source', {}).get('md5') == get_local_md5()
 
 
-def get_author2pubs():
-    if not os.path.exists(f'{LOCAL_DIR}/author2pubs.2020.json.gz'):
+def _previous_index():
+    # an existing index whose unchanged records a rebuild can reuse
+    path = f'{LOCAL_DIR}/{INDEX_DIR}'
+    return path if index_version(path) == INDEX_VERSION else None
+
+
+def _replace_index(tmp_index):
+    # the co-author graph and name index live inside the index directory, so they go with it
+    path = f'{LOCAL_DIR}/{INDEX_DIR}'
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_index, path)
+
+
+def cache_author_pub_mappings():
+    # stream-parse fresh downloads; an interrupted one is resumed by get_dblp_file instead
+    if _needs_download() and _load_download_state(f'{LOCAL_DIR}/{LOCAL_FILE}.tmp') is None:
+        if refresh_dblp_data():
+            return
+        path = f'{LOCAL_DIR}/{LOCAL_FILE}'  # unchanged remote dump
+    else:
+        path = get_dblp_file()
+    # only rebuild if the dump or the index format changed
+    if _index_is_current():
+        return
+    tmp_index = f'{LOCAL_DIR}/{INDEX_DIR}.new'
+    _build_index(iter_dblp_records(path, previous=_previous_index()), tmp_index, _local_source())
+    _replace_index(tmp_index)
+
+
+# the index and the structures derived from it are mmapped, and loaded at most once per process
+@functools.cache
+def get_index():
+    if _needs_download() or not _index_is_current():
         cache_author_pub_mappings()
-    with gzip.open(f'{LOCAL_DIR}/author2pubs.2020.json.gz', 'r') as f:
-        author2pubs = json.load(f)
-    return author2pubs
+    with profiling.stage('index.open'):
+        return DblpIndex(f'{LOCAL_DIR}/{INDEX_DIR}')
+
+
+@functools.cache
+def get_coauthor_graph():
+    index = get_index()
+    if not os.path.exists(f'{index.path}/{COAUTHOR_DIR}/meta.json'):
+        print('building co-author graph')
+        with profiling.stage('index.build_coauthor_graph'):
+            write_coauthor_graph(index, f'{index.path}/{COAUTHOR_DIR}')
+    return CoauthorGraph(index, f'{index.path}/{COAUTHOR_DIR}')
+
+
+@functools.cache
+def get_name_index():
+    index = get_index()
+    if not os.path.exists(f'{index.path}/{NAMES_DIR}/meta.json'):
+        print('building name index')
+        with profiling.stage('index.build_name_index'):
+            write_name_index(index, f'{index.path}/{NAMES_DIR}')
+    return NameIndex(index, f'{index.path}/{NAMES_DIR}')
+
+
+def resolve_since(since=DEFAULT_SINCE, window=None):
+    # --window N takes precedence: the last N calendar years, the current one included (2 in 2026 is 2025-2026)
+    if window is not None:
+        return datetime.date.today().year - window + 1
+    return since
+
+
+def get_pub2authors(since=DEFAULT_SINCE):
+    return Pub2Authors(get_index(), since)
+
+
+def get_author2pubs(since=DEFAULT_SINCE):
+    return Author2Pubs(get_index(), since)
 
 
 def get_disambiguation2id():
-    if not os.path.exists(f'{LOCAL_DIR}/disambiguation2id.2020.json.gz'):
-        cache_author_pub_mappings()
-    with gzip.open(f'{LOCAL_DIR}/disambiguation2id.2020.json.gz', 'r') as f:
-        disambiguation2id = json.load(f)
-    return disambiguation2id
+    return Disambiguation2Id(get_index())
 
 
 def get_author2id():
-    if not os.path.exists(f'{LOCAL_DIR}/author2id.2020.json.gz'):
-        author2pub = get_author2pubs()
-        author2id = {}
-        for author, pubs in author2pub.items():
-            author_homepages = [x for x in pubs if x.startswith('homepages/')]
-            if author_homepages:
-                author_id = author_homepages[0][len('homepages/'):]
-                author2id[author] = author_id
-        with gzip.open(f'{LOCAL_DIR}/author2id.2020.json.gz', 'wt') as f:
-            json.dump(author2id, f)
-        return author2id
-    else:
-        with gzip.open(f'{LOCAL_DIR}/author2id.2020.json.gz', 'r') as f:
-            author2id = json.load(f)
-        return author2id
+    return Author2Id(get_index())
+
+
+def get_id2affiliations():
+    return Id2Affiliations(get_index())
+
+
+def lookup_names(names, fuzzy=True):
+    # local matching of a batch of names: for each, {'id', 'affiliations'} of an exact match, the dblp id of
+    # its 'disambiguation' page, and otherwise the fuzzy 'strategy' and its 'candidates' as
+    # [(dblp id, dblp name, score, affiliations)]
+    author2id = get_author2id()
+    disambiguation2id = get_disambiguation2id()
+    id2affiliations = get_id2affiliations()
+    name_index = get_name_index() if fuzzy else None
+    results = []
+    for name in names:
+        result = {'id': author2id.get(name), 'affiliations': [], 'disambiguation': disambiguation2id.get(name),
+                  'strategy': None, 'candidates': []}
+        if result['id'] is not None:
+            result['affiliations'] = id2affiliations.get(result['id'], [])
+        elif name_index is not None:
+            result['strategy'], candidates = name_index.candidates(name)
+            result['candidates'] = [(dblp_id, dblp_name, score, id2affiliations.get(dblp_id, []))
+                                    for dblp_id, dblp_name, score in candidates]
+        results.append(result)
+    return results
 
 
 def get_author_id_affiliations(author_id):
+    index = get_index()
+    homepage = index.pubs.find(HOMEPAGE_PREFIX + author_id)
+    if homepage >= 0:
+        return index.affiliations(homepage)
+
+    # fall back on dblp's record for people that are newer than the local dump
     if not os.path.exists(f'{LOCAL_DIR}/ext_author_info'):
         os.makedirs(f'{LOCAL_DIR}/ext_author_info', exist_ok=True)
     author_id_path = author_id.replace('/', '__')
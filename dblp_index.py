@@ -0,0 +1,726 @@
+import os
+import re
+import json
+import bisect
+import mmap
+import array
+import shutil
+import unicodedata
+from collections.abc import Mapping, ItemsView
+
+INDEX_VERSION = 5
+COAUTHOR_DIR = 'coauthors'
+NAMES_DIR = 'names'
+OFFSET_TYPE = 'q'
+ID_TYPE = 'i'
+HOMEPAGE_PREFIX = 'homepages/'
+HOMONYM_RE = re.compile(r'\s+\d{4}$')
+NON_WORD_RE = re.compile(r'[\W_]+')
+# letters that NFKD does not decompose into a base letter plus accents
+FOLD_TABLE = str.maketrans({'ß': 'ss', 'ø': 'o', 'Ø': 'O', 'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ð': 'd', 'Ð': 'D',
+                            'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE', 'þ': 'th', 'Þ': 'TH', 'ı': 'i'})
+TRIGRAM_MIN_SCORE = 0.7
+MAX_GRAM_POSTINGS = 100_000
+MAX_TRIGRAM_CANDIDATES = 50
+
+# On-disk layout (all files in one directory, native byte order):
+#   meta.json                      manifest (format version, source dump md5/etag, years covered), counts and
+#                                  year partitions
+#   <table>.str / .off / .srt      string table: utf-8 blob, offsets, ids in sorted order
+#   <postings>.off / .val          CSR postings: offsets into a flat array of ids
+#   author_homepage.val            pub id of each author's homepage record (-1 if none)
+#   pub_year.val                   year of each pub (0 if none)
+#   pub_affiliations.off / .val    affiliation ids of each homepage record (undated pubs only)
+#   pub_hash.val                   hash of each pub's raw xml record (0 if unknown)
+#   pub_hash_sorted.val / _ids.val pub hashes in sorted order and the corresponding pub ids
+#
+# Pub ids are assigned in (year, document order), so every year is a contiguous partition of ids (listed in
+# meta.json), with undated records (e.g., homepages) first. Postings are sorted, so restricting them to a
+# window of years is a couple of binary searches.
+#   coauthors/                     co-author graph derived from the above (see write_coauthor_graph)
+#   names/                         fuzzy name-resolution index derived from the above (see write_name_index)
+
+
+def _map_array(path, typecode):
+    if os.path.getsize(path) == 0:
+        return memoryview(array.array(typecode))
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)
+
+
+def index_meta(path):
+    if not os.path.exists(f'{path}/meta.json'):
+        return None
+    with open(f'{path}/meta.json') as f:
+        return json.load(f)
+
+
+def index_version(path):
+    return (index_meta(path) or {}).get('version')
+
+
+def update_index_meta(path, **fields):
+    meta = index_meta(path)
+    meta.update(fields)
+    with open(f'{path}/meta.json', 'w') as f:
+        json.dump(meta, f)
+
+
+def _write_array(path, typecode, values):
+    with open(path, 'wb') as f:
+        if hasattr(values, 'astype'):  # numpy arrays
+            values.astype(typecode, copy=False).tofile(f)
+        else:
+            array.array(typecode, values).tofile(f)
+
+
+def _without_diagonal(matrix):
+    import scipy.sparse
+    matrix = (matrix - scipy.sparse.diags(matrix.diagonal(), dtype=matrix.dtype)).tocsr()
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    return matrix
+
+
+def write_strings(path, name, strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array.array(OFFSET_TYPE, [0])
+    with open(f'{path}/{name}.str', 'wb') as f:
+        for value in encoded:
+            f.write(value)
+            offsets.append(offsets[-1] + len(value))
+    _write_array(f'{path}/{name}.off', OFFSET_TYPE, offsets)
+    _write_array(f'{path}/{name}.srt', ID_TYPE, sorted(range(len(encoded)), key=encoded.__getitem__))
+
+
+def write_postings(path, name, lists):
+    offsets = array.array(OFFSET_TYPE, [0])
+    values = array.array(ID_TYPE)
+    for ids in lists:
+        values.extend(ids)
+        offsets.append(len(values))
+    _write_array(f'{path}/{name}.off', OFFSET_TYPE, offsets)
+    _write_array(f'{path}/{name}.val', ID_TYPE, values)
+
+
+class StringTable:
+    def __init__(self, path, name):
+        self._blob = _map_array(f'{path}/{name}.str', 'B')
+        self._offsets = _map_array(f'{path}/{name}.off', OFFSET_TYPE)
+        self._sorted = _map_array(f'{path}/{name}.srt', ID_TYPE)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _raw(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def find(self, value):
+        # binary search over the sorted permutation; returns the string's id or -1
+        target = value.encode('utf-8')
+        lo, hi = 0, len(self._sorted)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(self._sorted[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._sorted) and self._raw(self._sorted[lo]) == target:
+            return self._sorted[lo]
+        return -1
+
+
+class Postings:
+    def __init__(self, path, name):
+        self._offsets = _map_array(f'{path}/{name}.off', OFFSET_TYPE)
+        self._values = _map_array(f'{path}/{name}.val', ID_TYPE)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._values[self._offsets[i]:self._offsets[i + 1]]
+
+
+class DblpIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(f'{path}/meta.json') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f'unsupported index version in {path}: {self.meta.get("version")}')
+        self.authors = StringTable(path, 'authors')
+        self.pubs = StringTable(path, 'pubs')
+        self.author_pubs = Postings(path, 'author_pubs')
+        self.pub_authors = Postings(path, 'pub_authors')
+        self.author_homepage = _map_array(f'{path}/author_homepage.val', ID_TYPE)
+        self.pub_year = _map_array(f'{path}/pub_year.val', ID_TYPE)
+        self.disambiguation_names = StringTable(path, 'disambiguation_names')
+        self.disambiguation_ids = StringTable(path, 'disambiguation_ids')
+        self.affiliation_names = StringTable(path, 'affiliation_names')
+        self.pub_affiliations = Postings(path, 'pub_affiliations')
+        self.pub_hash_sorted = _map_array(f'{path}/pub_hash_sorted.val', OFFSET_TYPE)
+        self.pub_hash_ids = _map_array(f'{path}/pub_hash_ids.val', ID_TYPE)
+        self.partitions = self.meta['partitions']
+
+    def window(self, since=None):
+        # ranges of pub ids that are undated or from `since` onwards (all pubs if since is None)
+        if since is None:
+            return [(0, len(self.pubs))]
+        undated_end = 0
+        start = len(self.pubs)
+        for year, first, last in self.partitions:
+            if year == 0:
+                undated_end = last
+            elif year >= since:
+                start = min(start, first)
+        if undated_end == start:
+            return [(0, len(self.pubs))]
+        return [(lo, hi) for lo, hi in [(0, undated_end), (start, len(self.pubs))] if lo < hi]
+
+    @staticmethod
+    def in_window(ids, ranges):
+        # restrict sorted pub ids to the given window ranges
+        result = []
+        for lo, hi in ranges:
+            result.extend(ids[bisect.bisect_left(ids, lo):bisect.bisect_left(ids, hi)])
+        return result
+
+    def affiliations(self, pub):
+        # affiliations listed on a homepage record, by pub id
+        if pub >= len(self.pub_affiliations):
+            return []
+        return [self.affiliation_names[a] for a in self.pub_affiliations[pub]]
+
+    def find_hashes(self, hashes):
+        # pub ids of the records with the given content hashes (-1 for those not in the index)
+        import numpy as np
+        sorted_hashes = np.frombuffer(self.pub_hash_sorted, dtype=np.int64)
+        if not len(sorted_hashes):
+            return [-1] * len(hashes)
+        hashes = np.array(hashes, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+        ids = np.frombuffer(self.pub_hash_ids, dtype=np.int32)[pos]
+        return np.where((sorted_hashes[pos] == hashes) & (hashes != 0), ids, -1).tolist()
+
+    def author_id(self, author):
+        # dblp id (homepage key without the prefix) of the author with internal id `author`, or None
+        homepage = self.author_homepage[author]
+        if homepage < 0:
+            return None
+        return self.pubs[homepage][len(HOMEPAGE_PREFIX):]
+
+
+def write_coauthor_graph(index, path):
+    # Nodes are people (one per homepage record, merging all of a person's names). For each node we store
+    # its sorted pub ids, and its sorted neighbours with the number of shared pubs and the most recent year
+    # of one of them. Shared pub keys are recovered at query time by intersecting the two pub lists.
+    # numpy/scipy are only imported by the builders (and name lookups), keeping plain index loads fast
+    import numpy as np
+    import scipy.sparse
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    author_homepage = np.frombuffer(index.author_homepage, dtype=np.int32)
+    offsets = np.frombuffer(index.author_pubs._offsets, dtype=np.int64)
+    pubs = np.frombuffer(index.author_pubs._values, dtype=np.int32)
+    pub_year = np.frombuffer(index.pub_year, dtype=np.int32)
+    persons = np.unique(author_homepage[author_homepage >= 0])
+
+    entry_homepage = np.repeat(author_homepage, np.diff(offsets))
+    keep = entry_homepage >= 0
+    rows = np.searchsorted(persons, entry_homepage[keep])
+    incidence = scipy.sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, pubs[keep])), shape=(len(persons), len(index.pubs)))
+    incidence.sum_duplicates()
+    incidence.data[:] = 1
+
+    counts = _without_diagonal(incidence @ incidence.T)
+
+    # most recent shared year: max over per-year products. starting from 1 over the full pattern of
+    # `counts` keeps the sparsity structure (and so the value order) identical between the two matrices
+    recent = counts.copy()
+    recent.data[:] = 1
+    by_year = incidence.tocsc()
+    for year in np.unique(pub_year):
+        if year <= 1:
+            continue
+        year_incidence = by_year[:, np.flatnonzero(pub_year == year)]
+        shared = _without_diagonal(year_incidence @ year_incidence.T)
+        shared.data[:] = year
+        recent = recent.maximum(shared)
+    recent = recent.tocsr()
+    recent.sort_indices()
+    assert recent.nnz == counts.nnz
+    recent.data[recent.data == 1] = 0
+
+    _write_array(f'{tmp_path}/persons.val', ID_TYPE, persons)
+    _write_array(f'{tmp_path}/person_pubs.off', OFFSET_TYPE, incidence.indptr)
+    _write_array(f'{tmp_path}/person_pubs.val', ID_TYPE, incidence.indices)
+    _write_array(f'{tmp_path}/neighbours.off', OFFSET_TYPE, counts.indptr)
+    _write_array(f'{tmp_path}/neighbours.val', ID_TYPE, counts.indices)
+    _write_array(f'{tmp_path}/neighbour_counts.val', ID_TYPE, counts.data)
+    _write_array(f'{tmp_path}/neighbour_years.val', ID_TYPE, recent.data)
+    with open(f'{tmp_path}/meta.json', 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'persons': len(persons), 'edges': int(counts.nnz)}, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+class CoauthorGraph:
+    def __init__(self, index, path):
+        self.index = index
+        self._persons = _map_array(f'{path}/persons.val', ID_TYPE)
+        self._person_pubs = Postings(path, 'person_pubs')
+        self._neighbours = Postings(path, 'neighbours')
+        self._counts = _map_array(f'{path}/neighbour_counts.val', ID_TYPE)
+        self._years = _map_array(f'{path}/neighbour_years.val', ID_TYPE)
+        self._nodes = {}
+
+    def _node(self, dblp_id):
+        if dblp_id not in self._nodes:
+            homepage = self.index.pubs.find(HOMEPAGE_PREFIX + dblp_id)
+            i = bisect.bisect_left(self._persons, homepage)
+            if homepage < 0 or i == len(self._persons) or self._persons[i] != homepage:
+                i = -1
+            self._nodes[dblp_id] = i
+        return self._nodes[dblp_id]
+
+    def _dblp_id(self, node):
+        return self.index.pubs[self._persons[node]][len(HOMEPAGE_PREFIX):]
+
+    def __contains__(self, dblp_id):
+        return self._node(dblp_id) >= 0
+
+    def neighbours(self, dblp_id):
+        # [(neighbour dblp id, shared pubs, most recent shared year)]
+        node = self._node(dblp_id)
+        if node < 0:
+            return []
+        start = self._neighbours._offsets[node]
+        return [(self._dblp_id(n), self._counts[start + i], self._years[start + i]) for i, n in enumerate(self._neighbours[node])]
+
+    def edge(self, a, b):
+        # (shared pubs, most recent shared year) for two dblp ids, or None if they never co-authored
+        node_a, node_b = self._node(a), self._node(b)
+        if node_a < 0 or node_b < 0:
+            return None
+        if node_a == node_b:
+            pubs = self._person_pubs[node_a]
+            return len(pubs), max((self.index.pub_year[p] for p in pubs), default=0)
+        neighbours = self._neighbours[node_a]
+        i = bisect.bisect_left(neighbours, node_b)
+        if i == len(neighbours) or neighbours[i] != node_b:
+            return None
+        start = self._neighbours._offsets[node_a]
+        return self._counts[start + i], self._years[start + i]
+
+    def shared_pubs(self, a, b, since=None):
+        # keys of the pubs both dblp ids are authors of (all of a's pubs if a == b), restricted to the window
+        # starting at `since`, in index order
+        node_a, node_b = self._node(a), self._node(b)
+        if node_a < 0 or node_b < 0:
+            return []
+        window = self.index.window(since)
+        pubs_b = set(self.index.in_window(self._person_pubs[node_b], window))
+        return [self.index.pubs[p] for p in self.index.in_window(self._person_pubs[node_a], window) if p in pubs_b]
+
+    def pubs(self, dblp_id, since=None):
+        # keys of the pubs of a dblp id (without its homepage record), restricted to the window starting at `since`,
+        # in index order
+        node = self._node(dblp_id)
+        if node < 0:
+            return []
+        homepage = self._persons[node]
+        return [self.index.pubs[p] for p in self.index.in_window(self._person_pubs[node], self.index.window(since)) if p != homepage]
+
+    def conflicts(self, author_ids, committee_ids, since=None):
+        # {author: [(committee member, shared pub keys)]} for the authors who share pubs in the window with
+        # committee members (a member who is an author conflicts with themselves); neighbour order, then self
+        committee = set(committee_ids)
+        result = {}
+        for author in author_ids:
+            members = [neighbour for neighbour, _, _ in self.neighbours(author) if neighbour in committee]
+            if author in committee and author in self:
+                members.append(author)
+            shared = [(member, self.shared_pubs(author, member, since)) for member in members]
+            if any(pubs for _, pubs in shared):
+                result[author] = [(member, pubs) for member, pubs in shared if pubs]
+        return result
+
+
+def normalize_name(name):
+    # accent/case/punctuation-insensitive form of a name, without DBLP's homonym suffix ("Jane Doe 0002")
+    name = unicodedata.normalize('NFKD', HOMONYM_RE.sub('', name).translate(FOLD_TABLE))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(NON_WORD_RE.sub(' ', name.lower()).split())
+
+
+def _name_key(tokens):
+    # first initial and last name, e.g., "j doe" for "jane m doe"
+    return f'{tokens[0][0]} {tokens[-1]}' if len(tokens) > 1 else ' '.join(tokens)
+
+
+def _compatible(tokens, other):
+    # same last name, and first names that are equal or where one is the initial of the other
+    if len(tokens) < 2 or len(other) < 2 or tokens[-1] != other[-1]:
+        return tokens == other
+    a, b = tokens[0], other[0]
+    return a == b or (len(a) == 1 and b.startswith(a)) or (len(b) == 1 and a.startswith(b))
+
+
+def _trigrams(form):
+    padded = f' {form} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(grams, other):
+    return 2 * len(grams & other) / (len(grams) + len(other)) if grams or other else 0.0
+
+
+def write_name_index(index, path):
+    # Maps normalised forms of the names of everyone with a homepage to their homepage pub ids, with two
+    # ways of finding forms that don't match exactly: by first initial + last name (key_forms), and by shared
+    # character trigrams (gram_forms).
+    import numpy as np
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    form_ids = {}
+    form_persons = []
+    for author, name in enumerate(index.authors):
+        homepage = index.author_homepage[author]
+        if homepage < 0:
+            continue
+        form = normalize_name(name)
+        if form not in form_ids:
+            form_ids[form] = len(form_ids)
+            form_persons.append(set())
+        form_persons[form_ids[form]].add(homepage)
+
+    key_ids = {}
+    key_forms = []
+    gram_ids = {}
+    gram_entries = array.array(ID_TYPE)
+    form_entries = array.array(ID_TYPE)
+    for form, i in form_ids.items():
+        key = _name_key(form.split())
+        if key not in key_ids:
+            key_ids[key] = len(key_ids)
+            key_forms.append([])
+        key_forms[key_ids[key]].append(i)
+        for gram in _trigrams(form):
+            gram_entries.append(gram_ids.setdefault(gram, len(gram_ids)))
+            form_entries.append(i)
+
+    grams = np.frombuffer(gram_entries, dtype=np.int32)
+    forms = np.frombuffer(form_entries, dtype=np.int32)
+    order = np.lexsort((forms, grams))
+    gram_offsets = np.concatenate([[0], np.cumsum(np.bincount(grams, minlength=len(gram_ids)))])
+
+    write_strings(tmp_path, 'forms', form_ids)
+    write_postings(tmp_path, 'form_persons', (sorted(persons) for persons in form_persons))
+    write_strings(tmp_path, 'keys', key_ids)
+    write_postings(tmp_path, 'key_forms', key_forms)
+    write_strings(tmp_path, 'grams', gram_ids)
+    _write_array(f'{tmp_path}/gram_forms.off', OFFSET_TYPE, gram_offsets)
+    _write_array(f'{tmp_path}/gram_forms.val', ID_TYPE, forms[order])
+    with open(f'{tmp_path}/meta.json', 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'forms': len(form_ids), 'keys': len(key_ids), 'grams': len(gram_ids)}, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+class NameIndex:
+    def __init__(self, index, path):
+        self.index = index
+        self._forms = StringTable(path, 'forms')
+        self._form_persons = Postings(path, 'form_persons')
+        self._keys = StringTable(path, 'keys')
+        self._key_forms = Postings(path, 'key_forms')
+        self._grams = StringTable(path, 'grams')
+        self._gram_forms = Postings(path, 'gram_forms')
+
+    def _candidates(self, form, forms):
+        # [(dblp id, dblp name, score)] for the people with any of the given forms, best first
+        grams = _trigrams(form)
+        scores = {}
+        for i in forms:
+            score = _similarity(grams, _trigrams(self._forms[i]))
+            for homepage in self._form_persons[i]:
+                scores[homepage] = max(scores.get(homepage, 0.0), score)
+        return [(self.index.pubs[homepage][len(HOMEPAGE_PREFIX):], self.index.authors[self.index.pub_authors[homepage][0]], score)
+                for homepage, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+    def _trigram_forms(self, form):
+        # forms sharing the most trigrams with `form` (ignoring very common trigrams if there are rarer ones)
+        import numpy as np
+        postings = [self._gram_forms[g] for g in map(self._grams.find, _trigrams(form)) if g >= 0]
+        if not postings:
+            return []
+        postings = [p for p in postings if len(p) <= MAX_GRAM_POSTINGS] or postings
+        forms, counts = np.unique(np.concatenate([np.frombuffer(p, dtype=np.int32) for p in postings]), return_counts=True)
+        return forms[np.argsort(-counts, kind='stable')[:MAX_TRIGRAM_CANDIDATES]].tolist()
+
+    def candidates(self, name):
+        # (strategy, [(dblp id, dblp name, score)]) for the first strategy that finds anyone:
+        #   normalised: same name up to accents, case, punctuation and homonym suffixes
+        #   initials:   same last name and compatible first name/initial, in either order
+        #   trigram:    similar spelling (score >= TRIGRAM_MIN_SCORE)
+        form = normalize_name(name)
+        if not form:
+            return None, []
+        i = self._forms.find(form)
+        if i >= 0:
+            return 'normalised', self._candidates(form, [i])
+
+        tokens = form.split()
+        forms = set()
+        for query in (tokens, tokens[::-1]):
+            key = self._keys.find(_name_key(query))
+            if key >= 0:
+                forms.update(f for f in self._key_forms[key] if _compatible(query, self._forms[f].split()))
+        if forms:
+            return 'initials', self._candidates(form, forms)
+
+        candidates = [c for c in self._candidates(form, self._trigram_forms(form)) if c[2] >= TRIGRAM_MIN_SCORE]
+        if candidates:
+            return 'trigram', candidates
+        return None, []
+
+
+def write_index(path, publications, disambiguations, years, affiliations, hashes=None, source=None):
+    # publications: pub key -> list of author names (in document order)
+    # disambiguations: author name -> dblp id of the disambiguation page
+    # years: pub key -> year (0 if unknown)
+    # affiliations: homepage pub key -> list of affiliations
+    # hashes: pub key -> hash of its raw xml record, so that a later rebuild can reuse unchanged records
+    # source: identifies the dump the index was built from, e.g., {'md5': ..., 'etag': ...}
+    import numpy as np
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    pub_keys = sorted(publications, key=lambda key: years.get(key, 0))
+    author_ids = {}
+    pub_authors = []
+    for key in pub_keys:
+        pub_authors.append([author_ids.setdefault(name, len(author_ids)) for name in publications[key]])
+    author_pubs = [[] for _ in author_ids]
+    for pub, authors in enumerate(pub_authors):
+        for author in authors:
+            author_pubs[author].append(pub)
+
+    author_homepage = array.array(ID_TYPE, [-1]) * len(author_ids)
+    for author, pubs in enumerate(author_pubs):
+        for pub in pubs:
+            if pub_keys[pub].startswith(HOMEPAGE_PREFIX):
+                author_homepage[author] = pub
+                break
+
+    write_strings(tmp_path, 'authors', author_ids)
+    write_strings(tmp_path, 'pubs', pub_keys)
+    write_postings(tmp_path, 'author_pubs', author_pubs)
+    write_postings(tmp_path, 'pub_authors', pub_authors)
+    _write_array(f'{tmp_path}/author_homepage.val', ID_TYPE, author_homepage)
+    pub_year = [years.get(key, 0) for key in pub_keys]
+    partitions = []
+    for pub, year in enumerate(pub_year):
+        if not partitions or partitions[-1][0] != year:
+            partitions.append([year, pub, pub])
+        partitions[-1][2] = pub + 1
+    _write_array(f'{tmp_path}/pub_year.val', ID_TYPE, pub_year)
+    affiliation_ids = {}
+    undated = partitions[0][2] if partitions and partitions[0][0] == 0 else 0
+    write_postings(tmp_path, 'pub_affiliations', (
+        [affiliation_ids.setdefault(a, len(affiliation_ids)) for a in dict.fromkeys(affiliations.get(key, ()))]
+        for key in pub_keys[:undated]
+    ))
+    write_strings(tmp_path, 'affiliation_names', affiliation_ids)
+    pub_hash = np.array([(hashes or {}).get(key, 0) for key in pub_keys], dtype=np.int64)
+    hash_order = np.argsort(pub_hash, kind='stable')
+    _write_array(f'{tmp_path}/pub_hash.val', OFFSET_TYPE, pub_hash)
+    _write_array(f'{tmp_path}/pub_hash_sorted.val', OFFSET_TYPE, pub_hash[hash_order])
+    _write_array(f'{tmp_path}/pub_hash_ids.val', ID_TYPE, hash_order)
+    write_strings(tmp_path, 'disambiguation_names', disambiguations.keys())
+    write_strings(tmp_path, 'disambiguation_ids', disambiguations.values())
+    with open(f'{tmp_path}/meta.json', 'w') as f:
+        json.dump({
+            'version': INDEX_VERSION,
+            'source': source or {},
+            'years': [min((year for year in pub_year if year), default=0), max(pub_year, default=0)],
+            'authors': len(author_ids),
+            'pubs': len(pub_keys),
+            'authors_with_id': sum(1 for pub in author_homepage if pub >= 0),
+            'disambiguations': len(disambiguations),
+            'partitions': partitions,
+        }, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+class _IndexMapping(Mapping):
+    # read-only dict-like view over the index; subclasses translate keys to/from internal ids. views over
+    # pubs only see those in the window of years starting at `since` (plus undated records)
+
+    def __init__(self, index, since=None):
+        self._index = index
+        self._since = since
+        self._window = index.window(since)
+
+    def _find(self, key):
+        raise NotImplementedError
+
+    def _key(self, i):
+        raise NotImplementedError
+
+    def _value(self, i):
+        raise NotImplementedError
+
+    def _ids(self):
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        i = self._find(key) if isinstance(key, str) else -1
+        if i < 0:
+            raise KeyError(key)
+        return self._value(i)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self):
+        for i in self._ids():
+            yield self._key(i)
+
+    def items(self):
+        return _IndexItemsView(self)
+
+
+class _IndexItemsView(ItemsView):
+    def __iter__(self):
+        # walk internal ids directly rather than looking each key back up
+        for i in self._mapping._ids():
+            yield self._mapping._key(i), self._mapping._value(i)
+
+
+class Author2Pubs(_IndexMapping):
+    def _pubs(self, i):
+        return self._index.in_window(self._index.author_pubs[i], self._window)
+
+    def _find(self, key):
+        i = self._index.authors.find(key)
+        if i >= 0 and self._since is not None and not self._pubs(i):
+            return -1
+        return i
+
+    def _key(self, i):
+        return self._index.authors[i]
+
+    def _value(self, i):
+        return [self._index.pubs[p] for p in self._pubs(i)]
+
+    def _ids(self):
+        if self._since is None:
+            return range(len(self._index.authors))
+        return (i for i in range(len(self._index.authors)) if self._pubs(i))
+
+    def __len__(self):
+        if self._since is None:
+            return len(self._index.authors)
+        return sum(1 for _ in self._ids())
+
+
+class Pub2Authors(_IndexMapping):
+    def _find(self, key):
+        i = self._index.pubs.find(key)
+        if i >= 0 and not any(lo <= i < hi for lo, hi in self._window):
+            return -1
+        return i
+
+    def _key(self, i):
+        return self._index.pubs[i]
+
+    def _value(self, i):
+        return [self._index.authors[a] for a in self._index.pub_authors[i]]
+
+    def _ids(self):
+        return (i for lo, hi in self._window for i in range(lo, hi))
+
+    def __len__(self):
+        return sum(hi - lo for lo, hi in self._window)
+
+
+class Author2Id(_IndexMapping):
+    def _find(self, key):
+        i = self._index.authors.find(key)
+        if i >= 0 and self._index.author_homepage[i] < 0:
+            return -1
+        return i
+
+    def _key(self, i):
+        return self._index.authors[i]
+
+    def _value(self, i):
+        return self._index.author_id(i)
+
+    def _ids(self):
+        return (i for i in range(len(self._index.authors)) if self._index.author_homepage[i] >= 0)
+
+    def __len__(self):
+        return self._index.meta['authors_with_id']
+
+
+class Id2Affiliations(_IndexMapping):
+    def _find(self, key):
+        i = self._index.pubs.find(HOMEPAGE_PREFIX + key)
+        if i >= len(self._index.pub_affiliations):
+            return -1
+        return i
+
+    def _key(self, i):
+        return self._index.pubs[i][len(HOMEPAGE_PREFIX):]
+
+    def _value(self, i):
+        return self._index.affiliations(i)
+
+    def _ids(self):
+        return (i for i in range(len(self._index.pub_affiliations)) if self._index.pubs[i].startswith(HOMEPAGE_PREFIX))
+
+    def __len__(self):
+        return sum(1 for _ in self._ids())
+
+
+class Disambiguation2Id(_IndexMapping):
+    def _find(self, key):
+        return self._index.disambiguation_names.find(key)
+
+    def _key(self, i):
+        return self._index.disambiguation_names[i]
+
+    def _value(self, i):
+        return self._index.disambiguation_ids[i]
+
+    def _ids(self):
+        return range(len(self._index.disambiguation_names))
+
+    def __len__(self):
+        return len(self._index.disambiguation_names)
@@ -1,68 +1,137 @@
 from collections import defaultdict
+import os
 import csv
-from dblp_data import get_author2id, get_author2pubs, get_pub2authors
+import multiprocessing
+import profiling
+from dblp_data import resolve_since, DEFAULT_SINCE
+from index_server import get_coauthor_graph, connect, DEFAULT_SERVER_URL
 
+TRACK_COLUMNS = ['committee_csv', 'author_csv', 'output_csv']
 
-def main(committee_csv, author_csv):    
-    author2id = get_author2id()
 
-    id2pubs = {}
-    for author, pubs in get_author2pubs().items():
-        if author in author2id:
-            if author2id[author] not in id2pubs:
-                id2pubs[author2id[author]] = set()
-            id2pubs[author2id[author]].update(pubs)
-
-    pub2ids = {}
-    for pub, authors in get_pub2authors().items():
-        pub2ids[pub] = set()
-        for author in authors:
-            if author in author2id:
-                pub2ids[pub].add(author2id[author])
+def main(committee_csv, author_csv, *, shared_counts=False, since=DEFAULT_SINCE, client=None, output_csv='conflicts.csv'):
+    with profiling.stage('conflicts.load_graph'):
+        graph = get_coauthor_graph(client)
 
     # find conflicts as authors who have publications with a member of the committee
     committee_ids = {}
     person_num_mapping = {}
-    with open(committee_csv, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            if row.get('dblp_id'):
-                committee_ids[row['dblp_id']] = row['person #']
-            person_num_mapping[row['person #']] = row['first name'] + ' ' + row['last name']
+    with profiling.stage('conflicts.read_csvs'):
+        with open(committee_csv, newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                if row.get('dblp_id'):
+                    committee_ids[row['dblp_id']] = row['person #']
+                person_num_mapping[row['person #']] = row['first name'] + ' ' + row['last name']
+
+        with open(author_csv, newline='', encoding='utf-8') as csvfile:
+            authors = [row for row in csv.DictReader(csvfile) if row.get('dblp_id')]
+    profiling.count('conflicts.committee_members', len(committee_ids))
+    profiling.count('conflicts.authors', len(authors))
 
-    cois = defaultdict(list)
-    author_ids = {}
-    with open(author_csv, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            # Only update if conflicts is missing or empty
-            dblp = row.get('dblp_id')
-            if dblp:
-                author_ids[dblp] = row['person #']
+    # direct lookups in the co-author graph for all authors at once; a committee member who is an author
+    # conflicts with their own paper
+    with profiling.stage('conflicts.lookup'):
+        conflicts = graph.conflicts(dict.fromkeys(row['dblp_id'] for row in authors), committee_ids, since)
+        cois = defaultdict(list)
+        # distinct papers behind each conflict (a paper can come up through several authors of a submission, and a
+        # member who is an author conflicts through their homepage record, which isn't a paper)
+        shared_papers = defaultdict(set)
+        for row in authors:
             author_name = row['first name'] + ' ' + row['last name']
-            if dblp in id2pubs:
-                for pub in id2pubs[dblp]:
-                    for conflict in pub2ids[pub] & committee_ids.keys():
-                        cois[(row['submission #'], conflict)].append(f'{pub} with {author_name}')
+            for conflict, pubs in conflicts.get(row['dblp_id'], []):
+                for pub in pubs:
+                    cois[(row['submission #'], conflict)].append(f'{pub} with {author_name}')
+                    if not pub.startswith('homepages/'):
+                        shared_papers[(row['submission #'], conflict)].add(pub)
+    profiling.count('conflicts.pairs', len(cois))
 
-    with open('conflicts.csv', 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=['Member #', 'Member Name', 'submission #', 'conflict_details'])
+    fieldnames = ['Member #', 'Member Name', 'submission #', 'conflict_details']
+    if shared_counts:
+        fieldnames.append('shared_papers')
+    with profiling.stage('conflicts.write'), open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
         for submission_num, committee_dblp in sorted(cois):
             committee_num = committee_ids[committee_dblp]
             committee_name = person_num_mapping[committee_num]
-            writer.writerow({
+            record = {
                 'Member #': committee_num,
                 'Member Name': committee_name,
                 'submission #': submission_num,
                 'conflict_details': '; '.join(cois[submission_num, committee_dblp])
-            })
+            }
+            if shared_counts:
+                record['shared_papers'] = len(shared_papers[submission_num, committee_dblp])
+            writer.writerow(record)
+    return len(cois)
+
+
+def _run_track(args):
+    # a worker's profile (without what it inherited from the parent) goes back with its result
+    committee_csv, author_csv, output_csv, shared_counts, since = args
+    profiling.reset()
+    count = main(committee_csv, author_csv, shared_counts=shared_counts, since=since, output_csv=output_csv)
+    return output_csv, count, profiling.snapshot()
+
+
+def run_tracks(manifest_csv, *, shared_counts=False, since=DEFAULT_SINCE, workers=None, client=None):
+    # one (committee_csv, author_csv, output_csv) track per row of the manifest; relative paths are relative to the
+    # manifest. the co-author graph is loaded once up front, and the worker processes share its (mmapped) pages
+    base = os.path.dirname(os.path.abspath(manifest_csv))
+    with open(manifest_csv, newline='', encoding='utf-8') as csvfile:
+        tracks = [[os.path.join(base, row[column]) for column in TRACK_COLUMNS] for row in csv.DictReader(csvfile)]
+    workers = min(workers or os.cpu_count() or 1, len(tracks))
+    if client is not None or workers <= 1:
+        # one at a time (with an index server, it does the work anyway)
+        for committee_csv, author_csv, output_csv in tracks:
+            count = main(committee_csv, author_csv, shared_counts=shared_counts, since=since, client=client, output_csv=output_csv)
+            print(f'{output_csv}: {count} conflicts')
+        return
+    get_coauthor_graph()
+    with multiprocessing.Pool(workers) as pool:
+        for output_csv, count, profile in pool.imap(_run_track, [(*track, shared_counts, since) for track in tracks]):
+            profiling.merge(profile)
+            print(f'{output_csv}: {count} conflicts')
+
+
+def check(member_dblp, author_dblp, *, since=DEFAULT_SINCE, client=None):
+    graph = get_coauthor_graph(client)
+    edge = graph.edge(member_dblp, author_dblp)
+    pubs = graph.shared_pubs(member_dblp, author_dblp, since)
+    if not pubs:
+        print(f'no conflict between {member_dblp} and {author_dblp} since {since}')
+        return
+    count, year = edge
+    print(f'{member_dblp} and {author_dblp} share {len(pubs)} paper(s) since {since} ({count} in total, most recently in {year}):')
+    for pub in pubs:
+        print(f'  {pub}')
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Update CSV with DBLP IDs.")
-    parser.add_argument("committee_csv")
-    parser.add_argument("author_csv")
+    parser.add_argument("committee_csv", nargs='?')
+    parser.add_argument("author_csv", nargs='?')
+    parser.add_argument("--output_csv", default="conflicts.csv", help="where to write the conflicts (default: conflicts.csv)")
+    parser.add_argument("--tracks", metavar="MANIFEST_CSV", help=f"compute conflicts for several tracks, listed in a CSV file with {', '.join(TRACK_COLUMNS)} columns")
+    parser.add_argument("--workers", type=int, help="processes for --tracks (default: one per core, up to one per track)")
+    parser.add_argument("--shared_counts", action="store_true", help="add a shared_papers column with the number of co-authored papers")
+    parser.add_argument("--check", nargs=2, metavar=("MEMBER_DBLP_ID", "AUTHOR_DBLP_ID"), help="look up a single committee member/author pair")
+    parser.add_argument("--since", type=int, default=DEFAULT_SINCE, help=f"only count papers from this year onwards (default: {DEFAULT_SINCE})")
+    parser.add_argument("--window", type=int, help="only count papers from the last N years, the current one included (overrides --since)")
+    parser.add_argument("--server", nargs='?', const=DEFAULT_SERVER_URL, help=f"query a running index_server.py (default URL: {DEFAULT_SERVER_URL}) instead of loading the index")
+    parser.add_argument("--profile", metavar="REPORT_JSON", help="write the time, memory and counts of each stage to this file")
+    parser.add_argument("--cprofile", action="store_true", help="with --profile, also run under cProfile (stats in REPORT_JSON.prof)")
     args = parser.parse_args()
-    main(args.committee_csv, args.author_csv)
+    since = resolve_since(args.since, args.window)
+    if not (args.check or args.tracks or (args.committee_csv and args.author_csv)):
+        parser.error("committee_csv and author_csv are required unless --check or --tracks is given")
+    with profiling.profiled(args.profile, args.cprofile):
+        client = connect(args.server) if args.server else None
+        if args.check:
+            check(*args.check, since=since, client=client)
+        elif args.tracks:
+            run_tracks(args.tracks, shared_counts=args.shared_counts, since=since, workers=args.workers, client=client)
+        else:
+            main(args.committee_csv, args.author_csv, shared_counts=args.shared_counts, since=since, client=client, output_csv=args.output_csv)
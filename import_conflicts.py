@@ -1,110 +1,201 @@
 import pandas as pd
+import os
 import re
-import time
+import csv
+import sys
+from lxml import html
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 import argparse
 
-def navigate_and_wait(driver, url):
+WAIT_TIMEOUT = 60
+POLL_FREQUENCY = 0.1
+
+# texts of the cells of the add-conflict dialog, along with the cells themselves, in a single round trip
+READ_DIALOG_CELLS = '''
+const table = document.getElementsByClassName('addTable')[0];
+if (!table) return null;
+const tds = Array.from(table.querySelectorAll('td'));
+return [tds, tds.map(td => td.innerText.trim())];
+'''
+
+class Journal:
+    # append-only record of the (submission #, member name) conflicts that are in EasyChair, either added by this
+    # script or found to be there already, so that a restart can skip them
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, newline='', encoding='utf-8') as f:
+                for line, row in enumerate(csv.reader(f), 1):
+                    # a line cut short by a crash mid-write (or edited by hand) is skipped; its conflict is retried
+                    if len(row) != 2:
+                        print(f'Skipping malformed line {line} of {path}: {row}')
+                        continue
+                    self.done.add(tuple(row))
+
+    def record(self, submission_id, names):
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows((submission_id, name) for name in names)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update((submission_id, name) for name in names)
+
+def pending_conflicts(conflicts, journal):
+    return conflicts[[pair not in journal.done for pair in zip(conflicts['submission #'], conflicts['Member Name'])]]
+
+def print_journal_diff(conflicts, journal):
+    pending = pending_conflicts(conflicts, journal)
+    for submission_id, submission_conflicts in pending.groupby('submission #'):
+        print(f'Submission #{submission_id}: {", ".join(submission_conflicts["Member Name"])}')
+    print(f'{len(conflicts) - len(pending)} of {len(conflicts)} conflicts imported, {len(pending)} pending')
+    expected = set(zip(conflicts['submission #'], conflicts['Member Name']))
+    for submission_id, name in sorted(journal.done - expected):
+        print(f'  in the journal but not in the conflicts file: #{submission_id} {name}')
+
+def wait_until(driver, condition, timeout=WAIT_TIMEOUT):
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+
+def navigate_and_wait(driver, url, ready=None):
     driver.get(url)
-    WebDriverWait(driver, 60, poll_frequency=0.1).until(
-        lambda d: d.execute_script("return document.readyState") == "complete"
-    )
+    wait_until(driver, lambda d: d.execute_script("return document.readyState") == "complete")
     # verify the new url
     assert driver.current_url == url, f"navigation to {url} failed"
-    time.sleep(2) # wait for it to load property
-
-def handle_login(browser):
-    browser.get('https://easychair.org/account2/signin')
+    if ready is not None:
+        wait_until(driver, ready)
 
-    time.sleep(2)
-    while True:
-        time.sleep(0.5)
-        if browser.current_url.startswith('https://easychair.org/my2/welcome'):
-            break
+def handle_login(browser, origin='https://easychair.org', timeout=None):
+    # waits for the user to sign in, for as long as it takes unless there's a timeout
+    browser.get(f'{origin}/account2/signin')
+    wait_until(browser, lambda d: d.current_url.startswith(f'{origin}/my2/welcome'), timeout=float('inf') if timeout is None else timeout)
 
-def start_browser(browser_choice):
+def start_browser(browser_choice, headless=False):
     if browser_choice == 'firefox':
-        return webdriver.Firefox()
+        options = webdriver.FirefoxOptions()
+        if headless:
+            options.add_argument('-headless')
+        return webdriver.Firefox(options=options)
     elif browser_choice == 'chrome':
-        return webdriver.Chrome()
+        options = webdriver.ChromeOptions()
+        if headless:
+            options.add_argument('--headless=new')
+        return webdriver.Chrome(options=options)
     elif browser_choice == 'safari':
         return webdriver.Safari()
 
+def parse_conflicts_page(page_source):
+    # everything needed from the conflicts page in one pass: submission # -> (position of its "add conflict"
+    # link among all of them, its global id), and global id -> names of the existing conflicts
+    tree = html.fromstring(page_source)
+    links = {}
+    for i, link in enumerate(tree.xpath("//a[@class='conflict']")):
+        onclick = link.get('onclick') or ''
+        global_id = re.match(r'Conflict.add\((\d+),', onclick)
+        for submission_id in re.findall(r"'([^']*)'", onclick):
+            links.setdefault(submission_id, (i, global_id.group(1) if global_id else None))
+    existing = {}
+    for div in tree.xpath("//div[@class='conflict']"):
+        global_id = (div.get('id') or '').split(':')[0]
+        existing.setdefault(global_id, set()).add(div.text_content().split('(')[0].strip())
+    return links, existing
+
+def import_conflicts(browser, conflicts, conflicts_url, journal=None):
+    # the submissions table, which can have no "add conflict" links at all
+    navigate_and_wait(browser, conflicts_url, ready=EC.presence_of_element_located((By.TAG_NAME, 'table')))
+    links, existing = parse_conflicts_page(browser.page_source)
+    if not links:
+        print(f'No submissions to add conflicts to on {conflicts_url}, nothing to import')
+        return
+    for submission_id, submission_conflicts in conflicts.groupby('submission #'):
+        submission_conflicts = set(submission_conflicts["Member Name"].tolist())
+        print(f'Submission #{submission_id}')
+        if submission_id not in links or links[submission_id][1] is None:
+            print('  !! Could not find this submission !!')
+            print()
+            continue
+        link_position, submission_global_id = links[submission_id]
+        already = submission_conflicts & existing.get(submission_global_id, set())
+        for conflict_name in already:
+            submission_conflicts.discard(conflict_name)
+            print(f'  Already has conflict: {conflict_name}')
+        if journal is not None and already:
+            journal.record(submission_id, sorted(already))
+        if len(submission_conflicts) == 0:
+            print()
+            continue
+        browser.find_element(By.XPATH, f"(//a[@class='conflict'])[{link_position + 1}]").click()
+        wait_until(browser, EC.visibility_of_element_located((By.ID, 'add')))
+        # find td: <table class=".addTable">...<td>#conflict</td>...</table>
+        cells = browser.execute_script(READ_DIALOG_CELLS)
+        if cells is None:
+            print('  !! Could not find conflict table !!')
+            print()
+            continue
+        added = []
+        for td, conflict in zip(*cells):
+            if conflict in submission_conflicts:
+                td.click()
+                print(f'  Added conflict: {conflict}')
+                submission_conflicts.discard(conflict)
+                added.append(conflict)
+        if submission_conflicts:
+            print(f'  !! Could not find conflicts: {submission_conflicts} !!')
+        if added:
+            add_conflicts_button = browser.find_element(By.XPATH, "//*[@id='add']//button[text()='Add conflicts']")
+            add_conflicts_button.click()
+        else:
+            cancel_conflicts_button = browser.find_element(By.XPATH, "//*[@id='add']//button[text()='Cancel']")
+            cancel_conflicts_button.click()
+        # the dialog closes once EasyChair has taken the change
+        wait_until(browser, EC.invisibility_of_element_located((By.ID, 'add')))
+        if journal is not None and added:
+            journal.record(submission_id, added)
+        print()
+
 def main():
     parser = argparse.ArgumentParser(description='Tool to import conflict data to EasyChair.')
     parser.add_argument('conflicts_csv', help='conflicts.csv file to import')
     parser.add_argument('easychair_track_url', help='Track URL in EasyChair (e.g., <https://easychair.org/conferences2/submissions?a=XXXXXXXX>)')
     parser.add_argument('--webdriver',required=False,default='firefox',type=str,help='Whether to use firefox, chrome or safari (default: firefox)')
+    parser.add_argument('--headless', action='store_true', help='run the browser without a window (firefox and chrome)')
+    parser.add_argument('--journal', help='file recording the conflicts that are already imported (default: <conflicts_csv>.<track id>.journal)')
+    parser.add_argument('--dry-run', action='store_true', help='only list the conflicts that the journal does not have yet')
+    parser.add_argument('--login-timeout', type=float, help='seconds to wait for you to sign in to EasyChair (default: no limit)')
     args = parser.parse_args()
 
-    track_id_match = re.match(r'https://easychair\.org/conferences2/\w+\?a=(\d+)', args.easychair_track_url)
+    # the scheme and host come from the track URL, so the script can also be pointed at a local copy of the pages
+    track_id_match = re.match(r'(https?://[^/]+)/conferences2/\w+\?a=(\d+)', args.easychair_track_url)
     assert track_id_match is not None, "Invalid EasyChair track URL (should look like <https://easychair.org/conferences2/submissions?a=XXXXXXXX>)"
-    track_id = track_id_match.group(1)
+    origin, track_id = track_id_match.groups()
 
     # read conflicts.csv
     conflicts = pd.read_csv(args.conflicts_csv, dtype=str)
     assert 'Member Name' in conflicts.columns and 'submission #' in conflicts.columns
 
+    # submissions whose conflicts are all in the journal are skipped without going through the browser
+    journal = Journal(args.journal or f'{args.conflicts_csv}.{track_id}.journal')
+    if args.dry_run:
+        print_journal_diff(conflicts, journal)
+        return
+    pending = pending_conflicts(conflicts, journal)
+    if len(pending) == 0:
+        print(f'All {len(conflicts)} conflicts are already imported (according to {journal.path})')
+        return
+    print(f'Importing {len(pending)} of {len(conflicts)} conflicts ({len(conflicts) - len(pending)} already imported according to {journal.path})')
+
     assert args.webdriver in ['firefox','chrome','safari'], "--webdriver can be firefox, chrome or safari"
-    browser = start_browser(args.webdriver)
+    browser = start_browser(args.webdriver, args.headless)
     try:
-        handle_login(browser)
-        navigate_and_wait(browser, f'https://easychair.org/conferences2/conflicts?a={track_id}')
-        for submission_id, submission_conflicts in conflicts.groupby('submission #'):
-            submission_conflicts = set(submission_conflicts["Member Name"].tolist())
-            print(f'Submission #{submission_id}')
-            conflict_link = browser.find_elements(By.XPATH, f"//a[@class='conflict' and contains(@onclick, \"'{submission_id}'\")]")
-            if len(conflict_link) == 0:
-                conflict_link = None
-            else:
-                conflict_link = conflict_link[0]
-            if conflict_link is None:
-                print('  !! Could not find this submission !!')
-                print()
-                continue
-            # get the onclick attribute text
-            submission_global_id = re.match(r'Conflict.add\((\d+),', conflict_link.get_attribute('onclick')).group(1)
-            # find elements like <div id="@submission_global_id:\d+">
-            existing_conflicts = browser.find_elements(By.XPATH, f"//div[@class='conflict' and starts-with(@id, \"{submission_global_id}:\")]")
-            for existing_conflict in existing_conflicts:
-                conflict_name = existing_conflict.text.split('(')[0].strip()
-                if conflict_name in submission_conflicts:
-                    submission_conflicts.discard(conflict_name)
-                    print(f'  Already has conflict: {conflict_name}')
-            if len(submission_conflicts) == 0:
-                print()
-                continue
-            conflict_link.click()
-            WebDriverWait(browser, 60, poll_frequency=0.1).until(lambda d: d.find_element(By.ID, 'add'))
-            # find td: <table class=".addTable">...<td>#conflict</td>...</table>
-            add_table = browser.find_element(By.CLASS_NAME, 'addTable')
-            if add_table is None:
-                print('  !! Could not find conflict table !!')
-                print()
-                continue
-            tds = add_table.find_elements(By.XPATH, ".//td")
-            any_added = False
-            for td in tds:
-                conflict = td.text.strip()
-                if conflict in submission_conflicts:
-                    td.click()
-                    print(f'  Added conflict: {conflict}')
-                    submission_conflicts.discard(conflict)
-                    any_added = True
-            if submission_conflicts:
-                print(f'  !! Could not find conflicts: {submission_conflicts} !!')
-            if any_added:
-                add_conflicts_button = browser.find_element(By.XPATH, "//*[@id='add']//button[text()='Add conflicts']")
-                add_conflicts_button.click()
-            else:
-                cancel_conflicts_button = browser.find_element(By.XPATH, "//*[@id='add']//button[text()='Cancel']")
-                cancel_conflicts_button.click()
-            print()
-            time.sleep(0.5)
+        try:
+            handle_login(browser, origin, args.login_timeout)
+        except TimeoutException:
+            sys.exit(f'Not signed in to EasyChair after {args.login_timeout:g} seconds, giving up')
+        import_conflicts(browser, pending, f'{origin}/conferences2/conflicts?a={track_id}', journal)
     finally:
         browser.quit()
-    
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+import http.server
+import requests
+import dblp_data
+
+logger = logging.getLogger('index_server')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+DEFAULT_SERVER_URL = f'http://{DEFAULT_HOST}:{DEFAULT_PORT}'
+CONNECT_TIMEOUT = 1.0
+
+
+# Everything the server answers, as method name -> function of JSON-able arguments. Calls are batched where
+# the CLIs need many of them (lookup_names, conflicts), so a run takes a handful of requests.
+METHODS = {
+    'ping': lambda: True,
+    'author_id': lambda name: dblp_data.get_author2id().get(name),
+    'author_pubs': lambda name, since=dblp_data.DEFAULT_SINCE: dblp_data.get_author2pubs(since).get(name),
+    'person_pubs': lambda dblp_id, since=None: dblp_data.get_coauthor_graph().pubs(dblp_id, since),
+    'affiliations': lambda dblp_id: dblp_data.get_id2affiliations().get(dblp_id),
+    'lookup_names': lambda names, fuzzy=True: dblp_data.lookup_names(names, fuzzy),
+    'conflicts': lambda author_ids, committee_ids, since=None: dblp_data.get_coauthor_graph().conflicts(author_ids, committee_ids, since),
+    'edge': lambda a, b: dblp_data.get_coauthor_graph().edge(a, b),
+    'shared_pubs': lambda a, b, since=None: dblp_data.get_coauthor_graph().shared_pubs(a, b, since),
+}
+
+
+class IndexRequestHandler(http.server.BaseHTTPRequestHandler):
+    # POST / with {"method": ..., "args": [...]}; answers {"result": ...} or {"error": ...}
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            body = {'result': METHODS[request['method']](*request.get('args', []))}
+            status = 200
+        except Exception as e:
+            logger.exception('error handling request')
+            body = {'error': f'{type(e).__name__}: {e}'}
+            status = 400
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    # load (and if needed, build) everything up front so that requests never wait on it
+    dblp_data.get_index()
+    dblp_data.get_coauthor_graph()
+    dblp_data.get_name_index()
+    server = http.server.ThreadingHTTPServer((host, port), IndexRequestHandler)
+    logger.info(f'serving the dblp index on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class IndexClient:
+    def __init__(self, url=DEFAULT_SERVER_URL):
+        self.url = url
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+
+    def call(self, method, *args, timeout=None):
+        with self.lock:
+            response = self.session.post(self.url, json={'method': method, 'args': args}, timeout=timeout)
+        body = response.json()
+        if 'error' in body:
+            raise RuntimeError(f'index server: {body["error"]}')
+        return body['result']
+
+
+def connect(url=DEFAULT_SERVER_URL):
+    # an IndexClient if a server is answering at url, otherwise None (callers then load the index themselves)
+    client = IndexClient(url)
+    try:
+        client.call('ping', timeout=CONNECT_TIMEOUT)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f'index server at {url} is not available ({e}), loading the index in-process')
+        return None
+    return client
+
+
+class RemoteCoauthorGraph:
+    # the parts of CoauthorGraph that find_conflicts uses (and a person's pubs), answered by the server
+    def __init__(self, client):
+        self.client = client
+
+    def conflicts(self, author_ids, committee_ids, since=None):
+        result = self.client.call('conflicts', list(author_ids), list(committee_ids), since)
+        return {author: [(member, pubs) for member, pubs in shared] for author, shared in result.items()}
+
+    def edge(self, a, b):
+        edge = self.client.call('edge', a, b)
+        return tuple(edge) if edge is not None else None
+
+    def shared_pubs(self, a, b, since=None):
+        return self.client.call('shared_pubs', a, b, since)
+
+    def pubs(self, dblp_id, since=None):
+        return self.client.call('person_pubs', dblp_id, since)
+
+
+class RemoteAuthor2Pubs:
+    # the lookups match_dblp makes on author2pubs
+    def __init__(self, client, since=dblp_data.DEFAULT_SINCE):
+        self.client = client
+        self.since = since
+
+    def get(self, name, default=None):
+        pubs = self.client.call('author_pubs', name, self.since)
+        return default if pubs is None else pubs
+
+    def __getitem__(self, name):
+        pubs = self.get(name)
+        if pubs is None:
+            raise KeyError(name)
+        return pubs
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+def get_coauthor_graph(client=None):
+    return RemoteCoauthorGraph(client) if client else dblp_data.get_coauthor_graph()
+
+
+def get_author2pubs(since=dblp_data.DEFAULT_SINCE, client=None):
+    return RemoteAuthor2Pubs(client, since) if client else dblp_data.get_author2pubs(since)
+
+
+def lookup_names(names, fuzzy=True, client=None):
+    return client.call('lookup_names', list(names), fuzzy) if client else dblp_data.lookup_names(names, fuzzy)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve the dblp index to match_dblp.py and find_conflicts.py (--server).')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default: {DEFAULT_PORT})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port)
@@ -1,109 +1,373 @@
 import re
+import os
 import csv
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
 from urllib.parse import quote
-from dblp_data import get_author2id, get_disambiguation2id, get_author2pubs
-from pyterrier_services import DblpApi
+import requests
+from dblp_data import resolve_since, DEFAULT_SINCE, LOCAL_DIR
+from index_server import connect, lookup_names, get_author2pubs, DEFAULT_SERVER_URL
+from api_cache import ApiCache, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+import profiling
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('match_dblp')
 
-dblp = DblpApi()
-dblp_author_retr = dblp.retriever(num_results=30, entity_type='author', verbose=False)
-
 pub_re = re.compile('conf/(sigir|ecir)')
 
-author2pubs = get_author2pubs()
+DEFAULT_WORKERS = 8
+DEFAULT_RPS = 5.0
+MAX_RETRIES = 5
+CHECKPOINT_EVERY = 50
+MATCH_COLUMNS = ['docno', 'author', 'affiliations']  # what the interactive choices need of the API's candidates
+
+api_url = None  # overrides the DBLP API base URL (--api_url)
+_api = None
+_api_lock = threading.Lock()
+
+
+def get_dblp_api():
+    # pyterrier-services is slow to import, so the API client is only created once a lookup needs it
+    global _api
+    with _api_lock:
+        if _api is None:
+            from pyterrier_services import DblpApi
+            if api_url:
+                DblpApi.API_BASE_URL = api_url
+            dblp = DblpApi()
+            _api = dblp, dblp.retriever(num_results=30, entity_type='author', verbose=False)
+    return _api
+
+
+class RateLimiter:
+    # shared across worker threads: spaces out API calls to at most `rps` per second, and backs off
+    # (honouring Retry-After) when the API answers 429 Too Many Requests
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+        profiling.observe('api.rate_limit_wait', max(delay, 0.0))
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+    def call(self, fn, *args):
+        for attempt in range(MAX_RETRIES):
+            self.wait()
+            profiling.count('api.requests')
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 429 or attempt + 1 == MAX_RETRIES:
+                    raise
+                profiling.count('api.rate_limited')
+                retry_after = e.response.headers.get('Retry-After', '')
+                cooldown = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+                logger.warning(f'Too many requests, cooling down [{cooldown}sec]')
+                self.backoff(cooldown)
+            finally:
+                profiling.observe('api.request', time.perf_counter() - start)
+
+
+def timed_request(kind, fn, *args):
+    # latency of one API request by kind, without the rate limiter's waiting, back-off and retries around it
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        profiling.observe(f'api.{kind}', time.perf_counter() - start)
+
+
+def matches_affiliation(row, affiliations):
+    return any(row.get('affiliation', '').lower() in (a.lower() if a else '') for a in affiliations)
+
+
+def resolve_locally(row, name, result):
+    # offline matching against the name index (a lookup_names result). takes a single candidate, or the single
+    # one whose affiliation matches; candidates that are only similarly spelled (trigram) always need a matching
+    # affiliation. returns False to leave the row to the API
+    strategy, candidates = result['strategy'], result['candidates']
+    if len(candidates) > 1 or strategy == 'trigram':
+        candidates = [c for c in candidates if row.get('affiliation') and matches_affiliation(row, c[3])]
+    if len(candidates) != 1:
+        return False
+    dblp_id, dblp_name, _, affiliations = candidates[0]
+    logger.info(f'Matched {name} -> {dblp_id} using local {strategy} match')
+    profiling.count(f'matched.{strategy}')
+    row['dblp_id'] = dblp_id
+    row['dblp_name'] = dblp_name
+    row['dblp_affiliations'] = '; '.join(affiliations)
+    return True
+
+
+def lookup_candidates(name, disambiguation_id, limiter, cache):
+    # the network part of matching a name: the disambiguation page if there is one, otherwise a search (the
+    # API client is only created on a cache miss). returns where the candidates came from, and the candidates
+    matches = None
+    if disambiguation_id is not None:
+        logger.info(f'{name} matches disambiguation page (downloading)')
+        try:
+            matches = cache.call('disambiguation', disambiguation_id, limiter.call, lambda: timed_request('disambiguation', get_dblp_api()[0].load_disambiguation, disambiguation_id))
+        except Exception as e:
+            logger.error(f'Error loading disambiguation for {name}: {e}')
+            matches = None
+    if matches is not None and len(matches) > 0:
+        return 'disambiguation', matches
+    logger.info(f'perfomring api search for {name}')
+    try:
+        return 'search', cache.call('search', name, limiter.call, lambda: timed_request('search', get_dblp_api()[1].search, name))
+    except Exception as e:
+        logger.error(f'Error searching for {name}: {e}')
+        return 'search', None
+
+
+def load_author_record(dblp_id, limiter, cache):
+    logger.info(f'Loading author record for {dblp_id}')
+    try:
+        return cache.call('author', dblp_id, limiter.call, lambda: timed_request('author', get_dblp_api()[0].load_author, dblp_id))
+    except Exception as e:
+        logger.error(f'Error loading author record for {dblp_id}: {e}')
+        return None
+
+
+def fill_author_records(pool, rows, limiter, cache):
+    rows = [row for row in rows if row.get('dblp_id') and (not row.get('dblp_name') or not row.get('dblp_affiliations'))]
+    futures = [pool.submit(load_author_record, row['dblp_id'], limiter, cache) for row in rows]
+    for row, future in zip(rows, futures):
+        record = future.result()
+        if record:
+            if not row.get('dblp_name'):
+                row['dblp_name'] = record['name']
+            if not row.get('dblp_affiliations'):
+                row['dblp_affiliations'] = '; '.join(record.get('affiliations', [])) or '[None Listed]'
+
 
-def update_csv_with_dblp(input_file, output_file, *, interactive=False):
-    author2id = get_author2id()
-    disambiguation2id = get_disambiguation2id()
+class CheckpointedWriter:
+    # rows are appended to {output}.partial as they are done, and every chunk is fsynced and recorded in
+    # {output}.checkpoint (rows and bytes written, for which input, and the written rows that still need an
+    # interactive choice). a rerun on the same input carries on after the last checkpoint, and the output (by default,
+    # the input itself) is only replaced once every row is written
+    def __init__(self, output_file, fieldnames, input_md5, resume=True):
+        self.output_file = output_file
+        self.partial_file = f'{output_file}.partial'
+        self.checkpoint_file = f'{output_file}.checkpoint'
+        self.fieldnames = fieldnames
+        self.input_md5 = input_md5
+        self.rows = 0
+        self.prompts = []  # [row index, name, candidates (MATCH_COLUMNS records)]
+        state = self._load_checkpoint() if resume else None
+        if state is not None:
+            with open(self.partial_file, 'r+b') as f:
+                f.truncate(state['offset'])  # anything after the last checkpoint may be incomplete
+            self.rows = state['rows']
+            self.prompts = state.get('prompts', [])
+            self.file = open(self.partial_file, 'a', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        else:
+            self.file = open(self.partial_file, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+            self.writer.writeheader()
+            self.checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('input_md5') != self.input_md5 or state.get('fieldnames') != self.fieldnames:
+            logger.info(f'{self.checkpoint_file} is for a different input, starting over')
+            return None
+        if not os.path.exists(self.partial_file) or os.path.getsize(self.partial_file) < state['offset']:
+            logger.info(f'{self.partial_file} is missing or incomplete, starting over')
+            return None
+        return state
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        state = {'input_md5': self.input_md5, 'fieldnames': self.fieldnames, 'rows': self.rows, 'offset': os.fstat(self.file.fileno()).st_size,
+                 'prompts': self.prompts}
+        with open(f'{self.checkpoint_file}.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(f'{self.checkpoint_file}.tmp', self.checkpoint_file)
+
+    def write(self, rows, prompts=()):
+        with profiling.stage('match.write'):
+            self.writer.writerows(rows)
+            self.rows += len(rows)
+            self.prompts.extend(prompts)
+            self.checkpoint()
+
+    def finish(self, updates=None):
+        # updates: {row index: row} for rows that changed after they were written (the interactive choices)
+        self.file.close()
+        if updates:
+            with open(self.partial_file, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            for i, row in updates.items():
+                rows[i] = row
+            with open(f'{self.partial_file}.tmp', 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(f'{self.partial_file}.tmp', self.partial_file)
+        os.replace(self.partial_file, self.output_file)
+        os.remove(self.checkpoint_file)
+
+    def close(self):
+        # keeps the partial output and checkpoint if finish() wasn't reached
+        if not self.file.closed:
+            self.file.close()
+
+
+def update_csv_with_dblp(input_file, output_file, *, interactive=False, since=DEFAULT_SINCE, workers=DEFAULT_WORKERS, rps=DEFAULT_RPS,
+                         refresh=False, cache_ttl=DEFAULT_TTL, cache_size=DEFAULT_MAX_ENTRIES, local_match=True, client=None,
+                         checkpoint_every=CHECKPOINT_EVERY, resume=True):
+    limiter = RateLimiter(rps)
+    os.makedirs(LOCAL_DIR, exist_ok=True)
+    cache = ApiCache(f'{LOCAL_DIR}/api_cache.sqlite', ttl=cache_ttl, max_entries=cache_size, refresh=refresh)
 
     # Read the CSV
-    with open(input_file, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        fieldnames = reader.fieldnames if reader.fieldnames else []
-
-        # Add 'dblp' columns if they don't exist
-        if 'dblp_id' not in fieldnames:
-            fieldnames.append('dblp_id')
-        if 'dblp_name' not in fieldnames:
-            fieldnames.append('dblp_name')
-        if 'dblp_affiliations' not in fieldnames:
-            fieldnames.append('dblp_affiliations')
-
-        rows = []
-        for row in reader:
-            # Only update if dblp is missing or empty
-            if not row.get('dblp_id'):
-                name = (row.get('first name', '') + ' ' + row.get('last name', '')).strip()
-                if name in author2id:
-                    logger.info(f'Matched {name} -> {author2id[name]} using exact match')
-                    row['dblp_id'] = author2id[name]
-                    row['dblp_name'] = name
-                    row['dblp_affiliations'] = ''
-                else:
-                    matches = None
-                    if name in disambiguation2id:
-                        logger.info(f'{name} matches disambiguation page (downloading)')
-                        try:
-                            matches = dblp.load_disambiguation(disambiguation2id[name])
-                        except Exception as e:
-                            logger.error(f'Error loading disambiguation for {name}: {e}')
-                            matches = None
-                    if matches is not None and len(matches) > 0:
-                        choose_dblp_from_candidates(row, name, matches, interactive=interactive)
-                    else:
-                        logger.info(f'perfomring api search for {name}')
-                        try:
-                            matches = dblp_author_retr.search(name)
-                        except Exception as e:
-                            logger.error(f'Error searching for {name}: {e}')
-                            matches = None
-                        choose_dblp_from_candidates(row, name, matches, interactive=interactive)
-            if row.get('dblp_id') and (not row.get('dblp_name') or not row.get('dblp_affiliations')):
-                logger.info(f'Loading author record for {name} ' + row['dblp_id'])
-                try:
-                    record = dblp.load_author(row['dblp_id'])
-                except Exception as e:
-                    logger.error(f'Error loading author record for {row["dblp_id"]}: {e}')
-                    record = None
-                if record:
-                    if not row.get('dblp_name'):
-                        row['dblp_name'] = record['name']
-                    if not row.get('dblp_affiliations'):
-                        row['dblp_affiliations'] = '; '.join(record.get('affiliations', [])) or '[None Listed]'
-            rows.append(row)
-
-    # Write the updated CSV
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
-
-
-def choose_dblp_from_candidates(row, name, matches, *, interactive=False):
+    with profiling.stage('match.read_csv'), open(input_file, 'rb') as f:
+        input_md5 = hashlib.md5(f.read()).hexdigest()
+        with open(input_file, newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            fieldnames = reader.fieldnames if reader.fieldnames else []
+
+            # Add 'dblp' columns if they don't exist
+            if 'dblp_id' not in fieldnames:
+                fieldnames.append('dblp_id')
+            if 'dblp_name' not in fieldnames:
+                fieldnames.append('dblp_name')
+            if 'dblp_affiliations' not in fieldnames:
+                fieldnames.append('dblp_affiliations')
+            all_rows = list(reader)
+
+    # rows up to the last checkpoint of an interrupted run on this input are already in the partial output
+    output = CheckpointedWriter(output_file, fieldnames, input_md5, resume=resume)
+    if output.rows:
+        logger.info(f'Resuming after row {output.rows} of {len(all_rows)} (from {output.checkpoint_file})')
+    rows = all_rows[output.rows:]
+    # where the rows are in the output, for the interactive choices that are made once they are all written
+    positions = {id(row): output.rows + i for i, row in enumerate(rows)}
+    profiling.count('match.rows_resumed', output.rows)
+    profiling.count('match.rows', len(rows))
+
+    # Only update if dblp is missing or empty; exact and unambiguous fuzzy matches are resolved locally, the rest go to the API.
+    # all names are looked up in one batch (one request with --server), and the index is only loaded if there is
+    # anything to match
+    pending = [(i, (row.get('first name', '') + ' ' + row.get('last name', '')).strip()) for i, row in enumerate(rows) if not row.get('dblp_id')]
+    profiling.count('match.rows_to_match', len(pending))
+    with profiling.stage('match.local_lookup'):
+        results = lookup_names([name for _, name in pending], local_match, client) if pending else []
+        lookups = {}
+        for (i, name), result in zip(pending, results):
+            row = rows[i]
+            if result['id'] is not None:
+                logger.info(f'Matched {name} -> {result["id"]} using exact match')
+                profiling.count('matched.exact')
+                row['dblp_id'] = result['id']
+                row['dblp_name'] = name
+                # affiliations from the dump; left empty (and fetched from the API) if it lists none
+                row['dblp_affiliations'] = '; '.join(result['affiliations'])
+            elif not resolve_locally(row, name, result):
+                lookups[i] = (name, result['disambiguation'])
+
+    # rows are finished and written a chunk (checkpoint) at a time, in order. API calls run concurrently (under the
+    # rate limit), with the next chunk's calls already going while the current one is resolved. rows that need an
+    # interactive choice are written unresolved, and all of them are asked about once the last chunk is written
+    window_author2pubs = get_author2pubs(since, client) if lookups or (interactive and output.prompts) else None
+    profiling.count('match.rows_for_api', len(lookups))
+    chunks = [range(start, min(start + max(checkpoint_every, 1), len(rows))) for start in range(0, len(rows), max(checkpoint_every, 1))]
+    pool = concurrent.futures.ThreadPoolExecutor(max(workers, 1))
+    futures = {}
+
+    def submit(chunk):
+        for i in chunk:
+            if i in lookups:
+                futures[i] = pool.submit(lookup_candidates, *lookups[i], limiter, cache)
+
+    try:
+        for c, chunk in enumerate(chunks):
+            if c == 0:
+                submit(chunk)
+            if c + 1 < len(chunks):
+                submit(chunks[c + 1])
+            prompts = []
+            with profiling.stage('match.api_lookups'):
+                for i in chunk:
+                    if i in futures:
+                        source, matches = futures.pop(i).result()
+                        choose_dblp_from_candidates(rows[i], lookups[i][0], matches, interactive=interactive, author2pubs=window_author2pubs, prompts=prompts, source=source)
+                chunk_rows = [rows[i] for i in chunk]
+                fill_author_records(pool, chunk_rows, limiter, cache)
+            output.write(chunk_rows, [(positions[id(row)], name, matches[MATCH_COLUMNS].to_dict('records')) for row, name, matches in prompts])
+
+        updates = {}
+        if interactive and output.prompts:
+            import pandas as pd
+            print(f'{len(output.prompts)} name(s) need a choice')
+            print()
+            with profiling.stage('match.prompts'):
+                for i, name, matches in output.prompts:
+                    updates[i] = all_rows[i]
+                    choose_dblp_from_candidates(all_rows[i], name, pd.DataFrame(matches, columns=MATCH_COLUMNS), interactive=interactive, author2pubs=window_author2pubs)
+                fill_author_records(pool, list(updates.values()), limiter, cache)
+        output.finish(updates)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        output.close()
+        logger.info(f'API cache: {cache.hits} hits, {cache.misses} misses')
+        cache.close()
+
+
+def choose_dblp_from_candidates(row, name, matches, *, interactive=False, author2pubs=None, prompts=None, source='search'):
+    # source: where the candidates came from (a 'disambiguation' page or a 'search'), for the profile
     if matches is None:
+        profiling.count('unmatched.api_error')
         return
     elif len(matches) == 0:
+        profiling.count('unmatched.no_results')
         print(f'{name} - {row.get('affiliation')} {row.get('country')}')
         print('  [no matches found]')
         print()
     elif len(matches) == 1:
         logger.info(f'Matched {name} -> {matches.iloc[0]["docno"]} based on single result')
+        profiling.count(f'matched.{source}')
         row['dblp_id'] = matches.iloc[0]['docno']
         row['dblp_name'] = matches.iloc[0]['author']
         row['dblp_affiliations'] = '; '.join(matches.iloc[0]['affiliations']) or '[None Listed]'
     else:
-        affiliation_matches = matches[matches['affiliations'].apply(lambda affs: any(row.get('affiliation', '').lower() in (a.lower() if a else '') for a in affs))]
+        affiliation_matches = matches[matches['affiliations'].apply(lambda affs: matches_affiliation(row, affs))]
         if len(affiliation_matches) == 1:
             logger.info(f'Matched {name} -> {affiliation_matches.iloc[0]["docno"]} based on single affiliation match')
+            profiling.count('matched.affiliation')
             row['dblp_id'] = affiliation_matches.iloc[0]['docno']
             row['dblp_name'] = affiliation_matches.iloc[0]['author']
             row['dblp_affiliations'] = '; '.join(affiliation_matches.iloc[0]['affiliations']) or '[None Listed]'
+        elif interactive and prompts is not None:
+            # ask about it later, once all of the automatic matching is done
+            prompts.append((row, name, matches))
         elif len(matches) > 1:
             print(f'{name} - {row.get('affiliation')} {row.get('country')}')
             print(f'https://dblp.org/search?q={quote(name)}')
+            if author2pubs is None:
+                author2pubs = get_author2pubs()
             for i, record in enumerate(matches.itertuples()):
                 pubs = author2pubs.get(record.author, [])
                 pubs = [p for p in pubs if pub_re.search(p)][:5]
@@ -129,6 +393,7 @@ def choose_dblp_from_candidates(row, name, matches, *, interactive=False):
                         row['dblp_id'] = record['docno']
                         row['dblp_name'] = record['author']
                         row['dblp_affiliations'] = '; '.join(record['affiliations']) or '[None Listed]'
+            profiling.count('matched.interactive' if row.get('dblp_id') else 'unmatched.ambiguous')
             print()
 
 
@@ -138,9 +403,28 @@ if __name__ == "__main__":
     parser.add_argument("input_csv", help="Path to input CSV file")
     parser.add_argument("--output_csv", help="Path to save updated CSV file (defaults to input_csv if not provided)")
     parser.add_argument('--interactive', action='store_true')
+    parser.add_argument('--since', type=int, default=DEFAULT_SINCE, help=f'only show candidate papers from this year onwards (default: {DEFAULT_SINCE})')
+    parser.add_argument('--window', type=int, help='only show candidate papers from the last N years, the current one included (overrides --since)')
+    parser.add_argument('--no_local_match', action='store_true', help='only match names exactly before falling back on the DBLP API')
+    parser.add_argument('--server', nargs='?', const=DEFAULT_SERVER_URL, help=f'query a running index_server.py (default URL: {DEFAULT_SERVER_URL}) instead of loading the index')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'concurrent DBLP API requests (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS, help=f'maximum DBLP API requests per second (default: {DEFAULT_RPS})')
+    parser.add_argument('--api_url', help='base URL of the DBLP API, e.g., a local mirror or stub (default: the public API)')
+    parser.add_argument('--refresh', action='store_true', help='ignore cached DBLP API responses (fresh responses are still cached)')
+    parser.add_argument('--cache_ttl', type=float, default=DEFAULT_TTL / 86400, help=f'days to keep cached DBLP API responses (default: {DEFAULT_TTL // 86400})')
+    parser.add_argument('--checkpoint_every', type=int, default=CHECKPOINT_EVERY, help=f'rows written between checkpoints of the output (default: {CHECKPOINT_EVERY})')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint of an interrupted run and start from the first row')
+    parser.add_argument('--cache_size', type=int, default=DEFAULT_MAX_ENTRIES, help=f'maximum number of cached DBLP API responses (default: {DEFAULT_MAX_ENTRIES})')
+    parser.add_argument('--profile', metavar='REPORT_JSON', help='write the time, memory, API latency and match counts of each stage to this file')
+    parser.add_argument('--cprofile', action='store_true', help='with --profile, also run under cProfile (stats in REPORT_JSON.prof)')
     args = parser.parse_args()
+    api_url = args.api_url
     if args.output_csv is None:
         args.output_csv = args.input_csv
-    
-    update_csv_with_dblp(args.input_csv, args.output_csv, interactive=args.interactive)
+
+    with profiling.profiled(args.profile, args.cprofile):
+        update_csv_with_dblp(args.input_csv, args.output_csv, interactive=args.interactive, since=resolve_since(args.since, args.window), workers=args.workers, rps=args.rps,
+                             refresh=args.refresh, cache_ttl=args.cache_ttl * 86400, cache_size=args.cache_size,
+                             local_match=not args.no_local_match, client=connect(args.server) if args.server else None,
+                             checkpoint_every=args.checkpoint_every, resume=not args.restart)
     print(f"Updated CSV saved to {args.output_csv}")
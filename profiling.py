@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+import collections
+try:
+    import resource
+except ImportError:  # not on Windows, where peak memory isn't reported
+    resource = None
+
+# Process-wide record of where a run's time goes: stages (wall time, times entered, and their own peak RSS), counters and latency samples. Recording is always on; it happens per stage, block,
+# chunk or API call (never per record), so it costs next to nothing. The command line tools write it out with
+# --profile.
+_lock = threading.Lock()
+_stages = {}
+_counters = collections.Counter()
+_latencies = collections.defaultdict(list)
+_started = time.perf_counter()
+_peak_lock = threading.Lock()
+_open = []  # memory bookkeeping of the stages in progress
+_lifetime_peak = None  # the high-water marks from before each reset
+
+TOP_FUNCTIONS = 30
+PERCENTILES = (50, 90, 99)
+
+
+def _proc_status(field):
+    # a memory field of /proc/self/status in MiB, None where there's no /proc
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _high_water_mb():
+    # peak RSS since the high-water mark was last reset. on Linux a process's ru_maxrss carries over the peak of
+    # the process it was forked from, so its own peak comes from VmHWM. ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = _proc_status('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def peak_rss_mb(children=False):
+    # peak RSS of this process over its lifetime (or of its largest child process), None where it isn't available
+    if not children:
+        return _max(_lifetime_peak, _high_water_mb())
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+def _reset_high_water():
+    # folds the high-water mark into the stages in progress and the lifetime peak, then resets it (Linux only;
+    # False where it can't be). called with _peak_lock held
+    global _lifetime_peak
+    peak = _high_water_mb()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    _lifetime_peak = _max(_lifetime_peak, peak)
+    for memory in _open:
+        memory['peak'] = _max(memory['peak'], peak)
+    return True
+
+
+def _begin():
+    # a stage's own peak RSS: the high-water mark is reset when it starts and read when it ends (nested and
+    # concurrent stages keep theirs, as it is folded into them first). where it can't be reset, a stage gets its RSS
+    # at the end and how much the process's peak grew during it instead
+    with _peak_lock:
+        memory = {'peak': None, 'start_peak': peak_rss_mb()}
+        memory['reset'] = _reset_high_water()
+        _open.append(memory)
+    return memory
+
+
+def _end(memory):
+    with _peak_lock:
+        _open.remove(memory)
+        if memory['reset']:
+            return {'peak_rss_mb': _max(memory['peak'], _high_water_mb())}
+        peak = peak_rss_mb()
+        return {'rss_at_end_mb': _proc_status('VmRSS'),
+                'peak_rss_delta_mb': peak - memory['start_peak'] if peak is not None else None}
+
+
+def add_time(name, seconds, calls=1, memory=None):
+    with _lock:
+        entry = _stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += calls
+        for field, value in (memory or {}).items():
+            entry[field] = _max(entry.get(field), value)
+
+
+@contextlib.contextmanager
+def stage(name):
+    memory = _begin()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        add_time(name, seconds, memory=_end(memory))
+
+
+def timed(iterable, name):
+    # the time spent producing the items of `iterable` (but not consuming them) goes to stage `name`. meant for
+    # streams of blocks or chunks, not of single records
+    iterator = iter(iterable)
+    while True:
+        memory = _begin()
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            seconds = time.perf_counter() - start
+            add_time(name, seconds, memory=_end(memory))
+        yield item
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def observe(name, seconds):
+    with _lock:
+        _latencies[name].append(seconds)
+
+
+def snapshot():
+    with _lock:
+        return {'stages': {name: dict(entry) for name, entry in _stages.items()}, 'counters': dict(_counters),
+                'latencies': {name: list(samples) for name, samples in _latencies.items()}}
+
+
+def reset():
+    # forked worker processes start with a copy of their parent's record; they reset it, and send their
+    # snapshot() back to be merged
+    global _lifetime_peak
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _latencies.clear()
+    with _peak_lock:
+        _open.clear()
+        _lifetime_peak = None
+
+
+def merge(other):
+    with _lock:
+        for name, entry in other['stages'].items():
+            mine = _stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            mine['seconds'] += entry['seconds']
+            mine['calls'] += entry['calls']
+            for field, value in entry.items():
+                if field not in ('seconds', 'calls'):
+                    mine[field] = _max(mine.get(field), value)
+        _counters.update(other['counters'])
+        for name, samples in other['latencies'].items():
+            _latencies[name].extend(samples)
+
+
+def _summarise(samples):
+    samples = sorted(samples)
+    summary = {'count': len(samples), 'mean': sum(samples) / len(samples)}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = samples[min(len(samples) - 1, len(samples) * p // 100)]
+    summary['max'] = samples[-1]
+    return summary
+
+
+def report():
+    data = snapshot()
+    return {
+        'command': sys.argv,
+        'wall_seconds': time.perf_counter() - _started,
+        'peak_rss_mb': peak_rss_mb(),
+        'children_peak_rss_mb': peak_rss_mb(children=True),
+        'stages': data['stages'],
+        'counters': dict(sorted(data['counters'].items())),
+        # rows matched by match_dblp, by how they were matched
+        'matched': {name[len('matched.'):]: n for name, n in sorted(data['counters'].items()) if name.startswith('matched.')},
+        'latencies': {name: _summarise(samples) for name, samples in sorted(data['latencies'].items()) if samples},
+    }
+
+
+def _top_functions(profiler):
+    import pstats
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    top = []
+    for function in stats.fcn_list[:TOP_FUNCTIONS]:
+        _, calls, tottime, cumtime, _ = stats.stats[function]
+        filename, line, name = function
+        top.append({'function': f'{filename}:{line}({name})', 'calls': calls, 'tottime': tottime, 'cumtime': cumtime})
+    return top
+
+
+@contextlib.contextmanager
+def profiled(path, cprofile=False):
+    # writes the report to `path` (if given) once the block is done, even if it fails. with cprofile, the block also
+    # runs under cProfile (which only sees the main thread): the full stats go to {path}.prof, for pstats or snakeviz,
+    # and the top functions by cumulative time into the report
+    if not path:
+        yield
+        return
+    profiler = None
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        result = report()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f'{path}.prof')
+            result['cprofile'] = {'stats': f'{path}.prof', 'top': _top_functions(profiler)}
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'profile written to {path}')